@@ -460,6 +460,22 @@ class MorphStrings:
         default = True)
 
 
+class PruneShapekeysOptions:
+    threshold = FloatProperty(
+        name = "Morph Threshold",
+        description = "Remove shapekeys whose maximal offset (in cm) is below this value",
+        min = 0.0, max = 1.0,
+        precision = 4,
+        default = 0.01)
+
+    noise = FloatProperty(
+        name = "Vertex Threshold",
+        description = "Zero out vertex offsets (in cm) below this value",
+        min = 0.0, max = 1.0,
+        precision = 4,
+        default = 0.001)
+
+
 class CategoryString:
     category = StringProperty(
         name = "Category",
@@ -723,6 +739,16 @@ class Pinning:
         description = ""
     )
 
+    pinningProfiles = EnumProperty(
+        items = [('LINEAR', "Linear", "Linear falloff between X0 and X1"),
+                 ('SMOOTH', "Smooth", "Smoothstep falloff between X0 and X1"),
+                 ('QUADRATIC', "Quadratic", "Quadratic falloff between X0 and X1"),
+                 ],
+        name = "Profiles",
+        description = "Pinning profiles. Each profile gets its own vertex group",
+        options = {'ENUM_FLAG'},
+        default = {'LINEAR'})
+
 #-------------------------------------------------------------
 #   transfer.py
 #-------------------------------------------------------------
@@ -793,6 +819,23 @@ class MixShapekeysOptions:
         default = ""
         )
 
+
+class ShapekeyAlgebraOptions:
+    expressions = StringProperty(
+        name = "Expressions",
+        description = "Shapekey expressions separated by semicolons, e.g. New = 0.5*Key1 + Key2; Key3 *= 0.5",
+        default = "")
+
+    textName = StringProperty(
+        name = "Text",
+        description = "Text block with one shapekey expression per line",
+        default = "")
+
+    delete = BoolProperty(
+        name = "Delete Used",
+        description = "Delete shapekeys used in the expressions but not assigned to",
+        default = False)
+
 #-------------------------------------------------------------
 #   String properties
 #-------------------------------------------------------------
@@ -238,7 +238,7 @@ class DAZ_OT_InspectPropGroups(DazOperator, IsArmature):
 
 #-------------------------------------------------------------
 #   Dependencies
-#   For debugging
+#   Graph of properties driving other properties
 #-------------------------------------------------------------
 
 def clearDependecies():
@@ -254,9 +254,65 @@ def addDependency(key, prop, factor):
         deps = theDependecies[key] = []
     else:
         deps = theDependecies[key]
+    for n,dep in enumerate(deps):
+        if dep[0] == prop:
+            deps[n] = (prop,factor)
+            return
     deps.append((prop,factor))
 
 
+def sortDependencies():
+    global theDependecies
+    nparents = {}
+    for key,deps in theDependecies.items():
+        if key not in nparents.keys():
+            nparents[key] = 0
+        for prop,_factor in deps:
+            if prop in nparents.keys():
+                nparents[prop] += 1
+            else:
+                nparents[prop] = 1
+    queue = [prop for prop,n in nparents.items() if n == 0]
+    queue.sort(reverse=True)
+    order = []
+    while queue:
+        key = queue.pop()
+        order.append(key)
+        if key in theDependecies.keys():
+            for prop,_factor in theDependecies[key]:
+                nparents[prop] -= 1
+                if nparents[prop] == 0:
+                    queue.append(prop)
+    cycles = [prop for prop,n in nparents.items() if n > 0]
+    cycles.sort()
+    return order, cycles
+
+
+def flattenDependencies():
+    global theDependecies
+    order,cycles = sortDependencies()
+    combos = {}
+    depths = {}
+    for key in order:
+        if key not in combos.keys():
+            combos[key] = {}
+            depths[key] = 0
+        if key not in theDependecies.keys():
+            continue
+        for prop,factor in theDependecies[key]:
+            if prop in cycles:
+                continue
+            if prop not in combos.keys():
+                combos[prop] = {}
+                depths[prop] = 0
+            combo = combos[prop]
+            combo[key] = combo.get(key, 0.0) + factor
+            for ctrl,factor1 in combos[key].items():
+                combo[ctrl] = combo.get(ctrl, 0.0) + factor*factor1
+            depths[prop] = max(depths[prop], depths[key]+1)
+    return combos, depths, cycles
+
+
 class DAZ_OT_InspectPropDependencies(DazOperator, IsArmature):
     bl_idname = "daz.inspect_prop_dependencies"
     bl_label = "Inspect Prop Dependencies"
@@ -274,6 +330,19 @@ class DAZ_OT_InspectPropDependencies(DazOperator, IsArmature):
             for prop,val in dep[1:]:
                 print("  %-24s: %6.4f %-24s" % ("", val, prop))
 
+        combos,depths,cycles = flattenDependencies()
+        print("--- Flattened dependencies ---")
+        props = [prop for prop,depth in depths.items() if depth > 1]
+        props.sort()
+        for prop in props:
+            print("  %-24s: depth %d" % (prop, depths[prop]))
+            for ctrl,val in combos[prop].items():
+                print("  %-24s  %6.4f %-24s" % ("", val, ctrl))
+        if cycles:
+            print("--- Dependency cycles ---")
+            for prop in cycles:
+                print("  %s" % prop)
+
 #----------------------------------------------------------
 #   Panels
 #----------------------------------------------------------
@@ -367,6 +436,7 @@ class DAZ_PT_Setup(bpy.types.Panel):
                 box.operator("daz.transfer_other_morphs")
                 box.separator()
                 box.operator("daz.mix_shapekeys")
+                box.operator("daz.eval_shapekey_expressions")
 
         layout.separator()
         box = layout.box()
@@ -489,6 +559,7 @@ class DAZ_PT_Advanced(bpy.types.Panel):
             box.operator("daz.remove_standard_morphs")
             box.operator("daz.remove_custom_morphs")
             box.operator("daz.remove_jcms")
+            box.operator("daz.prune_shapekeys")
             box.separator()
             box.operator("daz.rename_category")
             box.operator("daz.remove_categories")
@@ -1218,12 +1289,18 @@ class DAZ_OT_GlobalSettings(DazOperator):
         box.prop(scn, "DazCaseSensitivePaths")
         box.prop(scn, "DazAddFaceDrivers")
         box.prop(scn, "DazBuildHighdef")
+        box.prop(scn, "DazUseDbzCache")
+        box.prop(scn, "DazUseHDCache")
 
         box.separator()
         box.prop(scn, "DazUsePropLimits")
         box.prop(scn, "DazUsePropDefault")
         box.prop(scn, "DazPropMin")
         box.prop(scn, "DazPropMax")
+        box.separator()
+        box.prop(scn, "DazPruneShapekeys")
+        if scn.DazPruneShapekeys:
+            box.prop(scn, "DazPruneThreshold")
 
         col = split.column()
         box = col.box()
@@ -1367,6 +1444,16 @@ def initialize():
         description = "Maximum value of properties",
         min = 0.0, max = 10.0)
 
+    bpy.types.Scene.DazPruneShapekeys = BoolProperty(
+        name = "Prune Shapekeys",
+        description = "Remove negligible shapekeys after loading morphs")
+
+    bpy.types.Scene.DazPruneThreshold = FloatProperty(
+        name = "Prune Threshold",
+        description = "Remove shapekeys whose maximal offset (in cm) is below this value",
+        min = 0.0, max = 1.0,
+        precision = 4)
+
     bpy.types.Scene.DazUsePropLimits = BoolProperty(
         name = "DAZ Property Limits",
         description = "Use the minima and maxima from DAZ files if available")
@@ -1526,6 +1613,14 @@ def initialize():
         name = "Build HD Meshes",
         description = "Build HD meshes if included in .dbz file")
 
+    bpy.types.Scene.DazUseDbzCache = BoolProperty(
+        name = "Cache DBZ Arrays",
+        description = "Save the arrays of .dbz files in a binary file next to it,\nwhich is memory-mapped when the .dbz file is loaded again")
+
+    bpy.types.Scene.DazUseHDCache = BoolProperty(
+        name = "Cache HD Meshes",
+        description = "Save built HD meshes next to the .dbz file,\nand reuse them when the HD data and base mesh are unchanged")
+
     bpy.types.Scene.DazStrandsAsHair = BoolProperty(
         name = "Strands As Hair",
         description = "Convert polylines to particle hair")
@@ -26,6 +26,7 @@
 # either expressed or implied, of the FreeBSD Project.
 
 
+import re
 import bpy
 from bpy.props import *
 from .error import *
@@ -429,6 +430,88 @@ def hasDriverVar(fcu, dname, rig):
 def getAllDriverVars(fcu):
     return [var.name for var in fcu.driver.variables]
 
+#-------------------------------------------------------------
+#   Linear prop drivers
+#   Drivers of the form c1*A + c2*B + ..., where every variable
+#   is a property of the rig.
+#-------------------------------------------------------------
+
+theLinearTerm = re.compile(r"([+-]*)(?:(\d+\.?\d*|\.\d+)\*)?([A-Za-z_]\w*)")
+
+def getDriverTerms(fcu, rig):
+    props = {}
+    for var in fcu.driver.variables:
+        trg = var.targets[0]
+        if (var.type != 'SINGLE_PROP' or
+            trg.id != rig or
+            trg.data_path[0:2] != '["' or
+            trg.data_path[-2:] != '"]'):
+            return None
+        props[var.name] = trg.data_path[2:-2]
+
+    string = fcu.driver.expression.replace(" ", "")
+    terms = {}
+    pos = 0
+    while pos < len(string):
+        match = theLinearTerm.match(string, pos)
+        if match is None or match.end() == pos:
+            return None
+        signs,coeff,vname = match.groups()
+        if vname not in props.keys():
+            return None
+        if pos > 0 and not signs:
+            return None
+        factor = (float(coeff) if coeff else 1.0)
+        if signs.count("-") % 2:
+            factor = -factor
+        prop = props[vname]
+        terms[prop] = terms.get(prop, 0.0) + factor
+        pos = match.end()
+    if not terms:
+        return None
+    return terms
+
+
+def setDriverTerms(fcu, rig, terms, maxlen=255):
+    # Leaves the driver untouched and returns False if the expression
+    # would be too long
+    vnames = {}
+    removes = []
+    for var in fcu.driver.variables:
+        prop = var.targets[0].data_path[2:-2]
+        if prop in terms.keys() and prop not in vnames.keys():
+            vnames[prop] = var.name
+        else:
+            removes.append(var)
+
+    taken = list(vnames.values())
+    free = [chr(n) for n in range(ord("A"), ord("Z")+1) if chr(n) not in taken]
+    n = 1
+    adds = []
+    string = ""
+    for prop,factor in terms.items():
+        if prop not in vnames.keys():
+            if free:
+                vname = free.pop(0)
+            else:
+                while "x%d" % n in taken:
+                    n += 1
+                vname = "x%d" % n
+                taken.append(vname)
+            adds.append((vname, prop))
+            vnames[prop] = vname
+        string += ("+%.4f*%s" % (factor, vnames[prop]))
+    string = (string[1:] if string else "0")
+    if len(string) > maxlen:
+        return False
+
+    for var in removes:
+        fcu.driver.variables.remove(var)
+    for vname,prop in adds:
+        addDriverVar(fcu, vname, prop, rig)
+    fcu.driver.expression = string
+    return True
+
 
 def replaceDriverBone(assoc, rna, path, idx=-1):
     for fcu in rna.animation_data.drivers:
@@ -261,6 +261,8 @@ class DazOperator(bpy.types.Operator):
             self.mode = context.object.mode
             bpy.ops.object.mode_set(mode='OBJECT')
         clearErrorMessage()
+        from .fileutils import uncheckFileIndices
+        uncheckFileIndices()
 
     def sequel(self, context):
         wm = bpy.context.window_manager
@@ -92,6 +92,55 @@ def getFolder(ob, scn, subdirs):
             return folder
     return None
 
+#-------------------------------------------------------------
+#   Find file in folder tree.
+#   The filenames below a folder are indexed the first time the
+#   folder is searched. The index is kept between operators and
+#   rebuilt when the modification time of some subfolder changes.
+#-------------------------------------------------------------
+
+theFileIndices = {}
+
+class FileIndex:
+    def __init__(self, folder):
+        self.files = {}
+        self.mtimes = {}
+        self.checked = True
+        self.addFolder(folder)
+
+
+    def addFolder(self, folder):
+        self.mtimes[folder] = os.stat(folder).st_mtime
+        for file in os.listdir(folder):
+            path = os.path.join(folder, file)
+            if file not in self.files.keys():
+                self.files[file] = path
+            if os.path.isdir(path):
+                self.addFolder(path)
+
+
+    def isModified(self):
+        for folder,mtime in self.mtimes.items():
+            try:
+                if os.stat(folder).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+
+def findFileRecursive(folder, tfile):
+    index = theFileIndices.get(folder)
+    if index is None or (not index.checked and index.isModified()):
+        index = theFileIndices[folder] = FileIndex(folder)
+    index.checked = True
+    return index.files.get(tfile)
+
+
+def uncheckFileIndices():
+    for index in theFileIndices.values():
+        index.checked = False
+
 
 """
 import winreg
@@ -508,25 +508,17 @@ class DAZ_OT_PruneVertexGroups(DazPropsOperator, B.ThresholdFloat, IsMesh):
                 self.pruneVertexGroups(ob)
 
     def pruneVertexGroups(self, ob):
-        keep = {}
-        removes = {}
-        vgroups = {}
+        wmat = WeightMatrix(ob)
+        keep = (wmat.weights > self.threshold)
+        used = set(wmat.groups[keep].tolist())
+        unused = []
         for vgrp in ob.vertex_groups:
-            keep[vgrp.index] = False
-            removes[vgrp.index] = []
-            vgroups[vgrp.index] = vgrp
-        for v in ob.data.vertices:
-            for g in v.groups:
-                if g.weight > self.threshold:
-                    keep[g.group] = True
-                else:
-                    removes[g.group].append(v.index)
-        for gn,vgrp in vgroups.items():
-            if not keep[gn]:
-                ob.vertex_groups.remove(vgrp)
+            if vgrp.index in used:
+                wmat.removeWeights(vgrp, ~keep)
             else:
-                for vn in removes[gn]:
-                    vgrp.remove([vn])
+                unused.append(vgrp)
+        for vgrp in unused:
+            ob.vertex_groups.remove(vgrp)
 
 #-------------------------------------------------------------
 #   Add IK goals
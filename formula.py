@@ -881,6 +881,56 @@ class PropFormulas(PoseboneDriver):
                 addVarToDriver(fcu, self.rig, prop, factor)
 
 
+    def flattenShapekeyDrivers(self):
+        from .daz import flattenDependencies
+        from .driver import getShapekeyPropDriver, getDriverTerms, setDriverTerms
+        combos,depths,cycles = flattenDependencies()
+        if cycles:
+            print("Dependency cycles, not flattened:")
+            for prop in cycles:
+                print("  %s" % prop)
+        if not (self.mesh and self.mesh.type == 'MESH' and self.rig):
+            return
+        skeys = self.mesh.data.shape_keys
+        if skeys is None:
+            return
+        ndrivers = nvars = maxdepth = 0
+        for sname in combos.keys():
+            if sname not in skeys.key_blocks.keys():
+                continue
+            fcu = getShapekeyPropDriver(skeys, sname)
+            if fcu is None:
+                continue
+            terms = getDriverTerms(fcu, self.rig)
+            if terms is None:
+                print("Driver not linear, not flattened:", sname)
+                continue
+            ndrivers += 1
+            # The flattened driver is the shapekey's own slider plus every
+            # ancestor once, with the factors summed over all paths.
+            # Terms that are not ancestors are kept as they are.
+            nterms = dict(terms)
+            if sname not in cycles:
+                for ctrl,factor in combos[sname].items():
+                    if ctrl in self.rig.keys() and ctrl != sname:
+                        nterms[ctrl] = factor
+            nterms = dict([(prop,factor) for prop,factor in nterms.items()
+                           if prop == sname or abs(factor) >= 1e-4])
+            if nterms != terms:
+                if setDriverTerms(fcu, self.rig, nterms):
+                    nvars += len(nterms) - len(terms)
+                else:
+                    print("Drive expression too long:", sname)
+                    nterms = terms
+            depth = 1
+            for prop in nterms.keys():
+                ancestors = [ctrl for ctrl in combos.get(prop, {}).keys() if ctrl in self.rig.keys()]
+                if prop != sname and not all([ctrl in nterms.keys() for ctrl in ancestors]):
+                    depth = max(depth, 1 + depths.get(prop, 0))
+            maxdepth = max(maxdepth, depth)
+        print("Morph drivers: %d shapekey drivers, %d flattened variables, depth %d" % (ndrivers, nvars, maxdepth))
+
+
     def addMissingBones(self, bones1, bones2):
         for bname in bones1.keys():
             data1 = bones1[bname]
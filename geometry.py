@@ -29,6 +29,7 @@ import math
 from mathutils import Vector, Matrix
 import os
 import bpy
+import numpy as np
 from collections import OrderedDict
 from .asset import Asset
 from .channels import Channels
@@ -96,11 +97,27 @@ class GeoNode(Node):
 
     def subdivideObject(self, ob, inst, context, cscale, center):
         if self.highdef:
-            me = self.buildHDMesh(ob, cscale, center)
-            hdob = self.hdobject = bpy.data.objects.new(ob.name + "_HD", me)
-            self.addHDMaterials(ob.data.materials, "")
-            self.arrangeObject(hdob, inst, context, cscale, center)
-            self.addMultires(ob, hdob)
+            key = me = None
+            if GS.useHDCache and self.highdef.filepath:
+                key = getHDCacheKey(self.highdef, ob, cscale, center)
+                me = loadHDCache(self.highdef.filepath, self.id, key)
+            if me:
+                me.name = ob.data.name + "_HD"
+                me.DazHDMaterials.clear()
+                hdob = self.hdobject = bpy.data.objects.new(ob.name + "_HD", me)
+                self.addHDMaterials(ob.data.materials, "")
+                self.arrangeObject(hdob, inst, context, cscale, center)
+                if me.get("DazHDMultires"):
+                    hdob.modifiers.new("Multires", 'MULTIRES')
+                    hdob.DazMultires = True
+            else:
+                me = self.buildHDMesh(ob, cscale, center)
+                hdob = self.hdobject = bpy.data.objects.new(ob.name + "_HD", me)
+                self.addHDMaterials(ob.data.materials, "")
+                self.arrangeObject(hdob, inst, context, cscale, center)
+                self.addMultires(ob, hdob)
+                if key and hdob.DazMultires:
+                    saveHDCache(self.highdef.filepath, self.id, key, hdob)
 
         if ob and self.data:
             self.data.buildRigidity(ob)
@@ -116,22 +133,26 @@ class GeoNode(Node):
 
 
     def buildHDMesh(self, ob, cscale, center):
-        verts = self.highdef.verts
-        uvs = self.highdef.uvs
-        hdfaces = self.highdef.faces
-        faces = self.stripNegatives([f[0] for f in hdfaces])
-        uvfaces = self.stripNegatives([f[1] for f in hdfaces])
-        mnums = [f[4] for f in hdfaces]
-        nverts = len(verts)
+        hd = self.highdef
+        nverts = len(hd.verts)
+        nfaces = len(hd.offsets) - 1
         me = bpy.data.meshes.new(ob.data.name + "_HD")
-        print("Build HD mesh for %s: %d verts, %d faces" % (ob.name, nverts, len(faces)))
-        me.from_pydata([cscale*vco-center for vco in verts], [], faces)
+        print("Build HD mesh for %s: %d verts, %d faces" % (ob.name, nverts, nfaces))
+        coords = cscale*hd.verts - np.array(center, dtype=np.float32)
+        me.vertices.add(nverts)
+        me.vertices.foreach_set("co", coords.astype(np.float32).ravel())
+        me.loops.add(len(hd.faces))
+        me.loops.foreach_set("vertex_index", hd.faces)
+        me.polygons.add(nfaces)
+        me.polygons.foreach_set("loop_start", hd.offsets[:-1])
+        me.polygons.foreach_set("loop_total", np.diff(hd.offsets))
+        me.polygons.foreach_set("material_index", hd.mnums)
+        me.polygons.foreach_set("use_smooth", np.ones(nfaces, dtype=bool))
+        me.update(calc_edges=True)
         print("HD mesh %s built" % me.name)
         uvlayers = getUvTextures(ob.data)
-        addUvs(me, uvlayers[0].name, uvs, uvfaces)
-        for f in me.polygons:
-            f.material_index = mnums[f.index]
-            f.use_smooth = True
+        uvloop = makeNewUvloop(me, uvlayers[0].name, True)
+        uvloop.data.foreach_set("uv", hd.uvs[hd.uvfaces].ravel())
         return me
 
 
@@ -167,10 +188,6 @@ class GeoNode(Node):
                 par.addHDMaterials(mats, inst.name + "?" + prefix)
 
 
-    def stripNegatives(self, faces):
-        return [(f if f[-1] >= 0 else f[:-1]) for f in faces]
-
-
     def getHDMatch(self, ob):
         return [(vn,vn) for vn in range(len(ob.data.vertices))]
 
@@ -274,24 +291,105 @@ class GeoNode(Node):
                 idxs.append(vgrp.index)
         vgname = "_HIDDEN_"
         vgrp = ob.vertex_groups.new(name=vgname)
-        for v in ob.data.vertices:
-            for g in v.groups:
-                if g.group in idxs:
-                    vgrp.add([v.index], 1, 'REPLACE')
-                    break
+        vnums = WeightMatrix(ob).getGroupVerts(idxs)
+        if len(vnums) > 0:
+            vgrp.add(vnums.tolist(), 1, 'REPLACE')
         mod = ob.modifiers.new(vgname, 'MASK')
         mod.vertex_group = vgname
         mod.invert_vertex_group = True
 
 
+#-------------------------------------------------------------
+#   HD mesh cache
+#   Built HD meshes, with multires displacements, are saved in
+#   .blend files next to the .dbz file and appended on reimport.
+#   The key is a hash of the HD arrays and the base mesh. Files are
+#   prefixed with a tag for the base geometry, so a new key replaces
+#   the old file for the same geometry, and the least recently used
+#   files are deleted when the folder holds too many.
+#-------------------------------------------------------------
+
+theMaxHDCacheFiles = 8
+
+def getHDCacheKey(hd, ob, cscale, center):
+    import hashlib
+    sha = hashlib.sha1()
+    for array in [hd.verts, hd.uvs, hd.faces, hd.offsets, hd.uvfaces, hd.mnums]:
+        sha.update(np.ascontiguousarray(array).tobytes())
+    sha.update(getCoordArray(ob.data.vertices).tobytes())
+    loops = np.empty(len(ob.data.loops), dtype=np.int32)
+    ob.data.loops.foreach_get("vertex_index", loops)
+    sha.update(loops.tobytes())
+    string = "%s %s %s %s" % (cscale, tuple(center), hd.lod, bpy.app.version[0:2])
+    sha.update(string.encode("utf-8"))
+    return sha.hexdigest()
+
+
+def getHDCacheFolder(filepath):
+    return os.path.splitext(filepath)[0] + "_hdcache"
+
+
+def getHDCacheTag(base):
+    import hashlib
+    return hashlib.sha1(str(base).encode("utf-8")).hexdigest()[0:8]
+
+
+def getHDCachePath(filepath, base, key):
+    file = "%s-%s.blend" % (getHDCacheTag(base), key)
+    return os.path.join(getHDCacheFolder(filepath), file)
+
+
+def loadHDCache(filepath, base, key):
+    path = getHDCachePath(filepath, base, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+        data_to.meshes = data_from.meshes[0:1]
+    if not data_to.meshes:
+        return None
+    print("HD mesh loaded from %s" % path)
+    return data_to.meshes[0]
+
+
+def saveHDCache(filepath, base, key, hdob):
+    me = hdob.data
+    me["DazHDMultires"] = True
+    path = getHDCachePath(filepath, base, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pruneHDCache(filepath, getHDCacheTag(base), theMaxHDCacheFiles-1)
+        bpy.data.libraries.write(path, {me})
+    except OSError as err:
+        print("Could not save HD cache %s:\n  %s" % (path, err))
+        return
+    print("HD mesh saved in %s" % path)
+
+
+def pruneHDCache(filepath, tag, maxfiles):
+    # Delete stale files for the same base geometry, and then the
+    # least recently used files until at most maxfiles remain
+    folder = getHDCacheFolder(filepath)
+    files = []
+    for file in os.listdir(folder):
+        if os.path.splitext(file)[1] != ".blend":
+            continue
+        path = os.path.join(folder, file)
+        if file.startswith(tag + "-"):
+            os.remove(path)
+        else:
+            files.append((os.path.getmtime(path), path))
+    files.sort()
+    for _,path in files[0:max(0, len(files)-maxfiles)]:
+        print("Remove old HD cache %s" % path)
+        os.remove(path)
+
+
 def isEmpty(vgrp, ob):
-    idx = vgrp.index
-    for v in ob.data.vertices:
-        for g in v.groups:
-            if (g.group == idx and
-                abs(g.weight-0.5) > 1e-4):
-                return False
-    return True
+    return WeightMatrix(ob).isEmpty(vgrp.index)
 
 #-------------------------------------------------------------
 #   Geometry Asset
@@ -518,7 +616,7 @@ class Geometry(Asset, Channels):
 
     def findUvSet(self, uv, url):
         from .asset import getDazPath, normalizePath, getRelativeRef
-        from .transfer import findFileRecursive
+        from .fileutils import findFileRecursive
         folder = getDazPath(os.path.dirname(url) + "/UV Sets")
         file = ("%s.dsf" % uv)
         if folder:
@@ -1001,24 +1099,11 @@ class DAZ_OT_LimitVertexGroups(DazPropsOperator, IsMesh, B.LimitInt):
                 self.limitVertexGroups(ob)
 
     def limitVertexGroups(self, ob):
-        deletes = dict([(vgrp.index, []) for vgrp in ob.vertex_groups])
-        weights = dict([(vgrp.index, []) for vgrp in ob.vertex_groups])
-        for v in ob.data.vertices:
-            data = [(g.weight, g.group) for g in v.groups]
-            if len(data) > self.limit:
-                data.sort()
-                vnmin = len(data) - self.limit
-                for w,gn in data[0:vnmin]:
-                    deletes[gn].append(v.index)
-                wsum = sum([w for w,gn in data[vnmin:]])
-                for w,gn in data[vnmin:]:
-                    weights[gn].append((v.index, w/wsum))
+        wmat = WeightMatrix(ob)
+        deleted,changed = wmat.limit(self.limit)
         for vgrp in ob.vertex_groups:
-            vnums = deletes[vgrp.index]
-            if vnums:
-                vgrp.remove(vnums)
-            for vn,w in weights[vgrp.index]:
-                vgrp.add([vn], w, 'REPLACE')
+            wmat.removeWeights(vgrp, deleted)
+            wmat.addWeights(vgrp, changed)
 
 #----------------------------------------------------------
 #   Initialize
@@ -27,6 +27,7 @@
 
 import sys
 import bpy
+import numpy as np
 from bpy.props import *
 from mathutils import Vector
 from math import floor
@@ -97,11 +98,7 @@ class HairSystem:
 
 
     def resize(self, size):
-        nstrands = []
-        for strand in self.strands:
-            nstrand = self.resizeStrand(strand, size)
-            nstrands.append(nstrand)
-        return nstrands
+        return resampleStrands(self.strands, size)
 
 
     def resizeBlock(self):
@@ -112,18 +109,7 @@ class HairSystem:
 
 
     def resizeStrand(self, strand, n):
-        m = len(strand)
-        step = (m-1)/(n-1)
-        nstrand = []
-        for i in range(n-1):
-            j = floor(i*step + 1e-4)
-            x = strand[j]
-            y = strand[j+1]
-            eps = i*step - j
-            z = eps*y + (1-eps)*x
-            nstrand.append(z)
-        nstrand.append(strand[m-1])
-        return nstrand
+        return resampleStrands([strand], n)[0]
 
 
     def build(self, context, ob):
@@ -176,22 +162,34 @@ class HairSystem:
         bpy.ops.object.mode_set(mode='OBJECT')
         psys.use_hair_dynamics = False
         psys = updateHair(context, ob, psys)
-        for m,hair in enumerate(psys.particles):
-            verts = strands[m]
-            hair.location = verts[0]
-            #print("H", m, len(verts))
-            if len(verts) < len(hair.hair_keys):
-                continue
-            for n,v in enumerate(hair.hair_keys):
-                v.co = verts[n]
-                #print("  ", n, verts[n], v.co)
-                pass
+        self.setHairKeys(psys, strands)
         psys = updateHair(context, ob, psys)
         self.setEditProperties(context, ob)
         self.psys = psys
         self.object = ob
 
 
+    def setHairKeys(self, psys, strands):
+        particles = psys.particles
+        if len(particles) == 0:
+            return
+        if len(particles) != len(strands):
+            raise DazError("Hair system %s has %d particles but %d strands" % (psys.name, len(particles), len(strands)))
+        nkeys = len(particles[0].hair_keys)
+        roots = np.array([strand[0] for strand in strands], dtype=np.float32)
+        particles.foreach_set("location", roots.ravel())
+        lengths = set([len(strand) for strand in strands])
+        if len(lengths) == 1 and nkeys <= min(lengths):
+            coords = np.array(strands, dtype=np.float32)[:,0:nkeys]
+            for hair,co in zip(particles, coords):
+                hair.hair_keys.foreach_set("co", co.ravel())
+        else:
+            for hair,strand in zip(particles, strands):
+                if len(strand) >= nkeys:
+                    co = np.array(strand[0:nkeys], dtype=np.float32)
+                    hair.hair_keys.foreach_set("co", co.ravel())
+
+
     def setEditProperties(self, context, hum):
         scn = context.scene
         activateObject(context, hum)
@@ -245,7 +243,7 @@ class DAZ_OT_MakeHair(DazPropsOperator, IsMesh, B.Hair):
 
 
     def run(self, context):
-        from .tables import getVertFaces, findNeighbors, findTexVerts
+        from .tables import getFaceNeighbors, getTexNeighbors
 
         self.nonquads = []
         scn = context.scene
@@ -262,52 +260,35 @@ class DAZ_OT_MakeHair(DazPropsOperator, IsMesh, B.Hair):
         bpy.ops.object.mode_set(mode='OBJECT')
 
         print("Find neighbors")
-        faceverts,vertfaces = getVertFaces(hair)
         nfaces = len(hair.data.polygons)
-        neighbors = findNeighbors(range(nfaces), faceverts, vertfaces)
-        centers,uvcenters = self.findCenters(hair)
-
-        print("Collect rects")
-        ordfaces = [(f.index,f.vertices) for f in hair.data.polygons]
-        rects1,_,_ = self.collectRects(ordfaces, neighbors)
+        self.selected = np.zeros(nfaces, dtype=bool)
+        neighbors = getFaceNeighbors(hair)
+        centers,uvcenters,nverts = self.findCenters(hair)
 
         print("Find texverts")
-        texverts,texfaces = findTexVerts(hair, vertfaces)
+        texverts,texfaces,texneighbors = getTexNeighbors(hair)
         print("Find tex neighbors", len(texverts), nfaces, len(texfaces))
-        # Improve
-        _,texvertfaces = getVertFaces(hair, texverts, None, texfaces)
-        neighbors = findNeighbors(range(nfaces), texfaces, texvertfaces)
-
-        rects = []
-        print("Collect texrects")
-        for verts1,faces1 in rects1:
-            texfaces1 = [(fn,texfaces[fn]) for fn in faces1]
-            nn = [(fn,neighbors[fn]) for fn in faces1]
-            rects2,clusters,fclusters = self.collectRects(texfaces1, neighbors, True)
-            for rect in rects2:
-                rects.append(rect)
+
+        print("Collect rects")
+        _,geoislands = self.findIslands(nfaces, neighbors)
+        labels,rects = self.findIslands(nfaces, texneighbors, geoislands)
 
         print("Sort columns")
         haircount = -1
-        setActiveObject(context, hair)
-        verts = range(len(hair.data.vertices))
         count = 0
-        for _,faces in rects:
+        for label,faces in enumerate(rects):
             if count % 10 == 0:
                 sys.stdout.write(".")
                 sys.stdout.flush()
             count += 1
-            if not self.quadsOnly(hair, faces):
+            if not self.quadsOnly(faces, nverts):
                 continue
-            _,vertfaces = getVertFaces(None, verts, faces, faceverts)
-            neighbors = findNeighbors(faces, faceverts, vertfaces)
-            if neighbors is None:
-                continue
-            first, corner, boundary, bulk = self.findStartingPoint(hair, neighbors, uvcenters)
+            rectneighbors = dict([(fn, [nb for nb in neighbors[fn] if labels[nb] == label]) for fn in faces])
+            first, corner, boundary, bulk = self.findStartingPoint(rectneighbors, uvcenters)
             if first is None:
                 continue
-            self.selectFaces(hair, faces)
-            columns = self.sortColumns(first, corner, boundary, bulk, neighbors, uvcenters)
+            self.selectFaces(faces)
+            columns = self.sortColumns(first, corner, boundary, bulk, rectneighbors, uvcenters)
             if columns:
                 strands = self.getColumnCoords(columns, centers)
                 for strand in strands:
@@ -320,6 +301,7 @@ class DAZ_OT_MakeHair(DazPropsOperator, IsMesh, B.Hair):
                     hsystems[n].strands.append(strand)
 
         print("Total number of strands: %d" % (haircount+1))
+        hair.data.polygons.foreach_set("select", self.selected)
 
         if self.resizeInBlocks:
             print("Resize hair in blocks of ten")
@@ -353,100 +335,84 @@ class DAZ_OT_MakeHair(DazPropsOperator, IsMesh, B.Hair):
             print("Ignored %d non-quad faces out of %d faces" % (len(self.nonquads), len(hair.data.polygons)))
 
     #-------------------------------------------------------------
-    #   Collect rectangles
+    #   Find islands
     #-------------------------------------------------------------
 
-    def collectRects(self, faceverts, neighbors, test=False):
-        #fclusters = dict([(fn,-1) for fn,_ in faceverts])
-        fclusters = {}
-        for fn,_ in faceverts:
-            fclusters[fn] = -1
-            for nn in neighbors[fn]:
-                fclusters[nn] = -1
-        clusters = {-1 : -1}
-        nclusters = 0
-
-        for fn,_ in faceverts:
-            fncl = [self.deref(nn, fclusters, clusters) for nn in neighbors[fn] if nn < fn]
-            if fncl == []:
-                cn = clusters[cn] = nclusters
-                nclusters += 1
-            else:
-                cn = min(fncl)
-                for cn1 in fncl:
-                    clusters[cn1] = cn
-            fclusters[fn] = cn
-
-        for fn,_ in faceverts:
-            fclusters[fn] = self.deref(fn, fclusters, clusters)
-
-        rects = []
-        for cn in clusters.keys():
-            if cn == clusters[cn]:
-                faces = [fn for fn,_ in faceverts if fclusters[fn] == cn]
-                vertsraw = [vs for fn,vs in faceverts if fclusters[fn] == cn]
-                vstruct = {}
-                for vlist in vertsraw:
-                    for vn in vlist:
-                        vstruct[vn] = True
-                verts = list(vstruct.keys())
-                verts.sort()
-                rects.append((verts, faces))
-                if len(rects) > 1000:
-                    print("Too many rects")
-                    return rects, clusters, fclusters
-
-        return rects, clusters, fclusters
-
-
-    def deref(self, fn, fclusters, clusters):
-        cn = fclusters[fn]
-        updates = []
-        while cn != clusters[cn]:
-            updates.append(cn)
-            cn = clusters[cn]
-        for nn in updates:
-            clusters[nn] = cn
-        fclusters[fn] = cn
-        return cn
+    def findIslands(self, nfaces, neighbors, parents=None):
+        """findIslands(self, nfaces, neighbors, parents=None):
+        Split the faces into connected islands in a single pass.
+        If parents are given, only neighbors in the same parent island
+        are followed. Returns the island label of each face and the
+        list of islands.
+        """
+        if parents is None:
+            parents = [list(range(nfaces))]
+        plabels = np.zeros(nfaces, dtype=np.int32)
+        for pn,faces in enumerate(parents):
+            plabels[faces] = pn
+        plabels = plabels.tolist()
+
+        labels = [-1 for fn in range(nfaces)]
+        islands = []
+        for faces in parents:
+            for fn in faces:
+                if labels[fn] >= 0:
+                    continue
+                label = len(islands)
+                labels[fn] = label
+                island = [fn]
+                stack = [fn]
+                while stack:
+                    fn1 = stack.pop()
+                    for fn2 in neighbors[fn1]:
+                        if labels[fn2] < 0 and plabels[fn2] == plabels[fn1]:
+                            labels[fn2] = label
+                            island.append(fn2)
+                            stack.append(fn2)
+                island.sort()
+                islands.append(island)
+        return labels, islands
 
     #-------------------------------------------------------------
     #   Find centers
     #-------------------------------------------------------------
 
     def findCenters(self, ob):
-        vs = ob.data.vertices
-        uvs = ob.data.uv_layers.active.data
-        centers = {}
-        uvcenters = {}
-        m = 0
-        for f in ob.data.polygons:
-            f.select = True
-            fn = f.index
-            if len(f.vertices) == 4:
-                vn0,vn1,vn2,vn3 = f.vertices
-                centers[fn] = (vs[vn0].co+vs[vn1].co+vs[vn2].co+vs[vn3].co)/4
-                uvcenters[fn] = (uvs[m].uv+uvs[m+1].uv+uvs[m+2].uv+uvs[m+3].uv)/4
-                m += 4
-            else:
-                vn0,vn1,vn2 = f.vertices
-                centers[fn] = (vs[vn0].co+vs[vn1].co+vs[vn2].co)/4
-                uvcenters[fn] = (uvs[m].uv+uvs[m+1].uv+uvs[m+2].uv)/4
-                m += 3
-            f.select = False
-        return centers, uvcenters
+        me = ob.data
+        nfaces = len(me.polygons)
+        nloops = len(me.loops)
+        coords = getCoordArray(me.vertices)
+        vnums = np.empty(nloops, dtype=np.int32)
+        me.loops.foreach_get("vertex_index", vnums)
+        uvs = np.empty(2*nloops, dtype=np.float32)
+        me.uv_layers.active.data.foreach_get("uv", uvs)
+        uvs = uvs.reshape((nloops,2))
+        starts = np.empty(nfaces, dtype=np.int32)
+        me.polygons.foreach_get("loop_start", starts)
+        nverts = np.empty(nfaces, dtype=np.int32)
+        me.polygons.foreach_get("loop_total", nverts)
+
+        fnums = np.repeat(np.arange(nfaces), nverts)
+        offsets = np.arange(len(fnums)) - np.repeat(np.cumsum(nverts)-nverts, nverts)
+        loops = np.repeat(starts, nverts) + offsets
+        centers = np.zeros((nfaces,3), dtype=np.float32)
+        np.add.at(centers, fnums, coords[vnums[loops]])
+        uvcenters = np.zeros((nfaces,2), dtype=np.float32)
+        np.add.at(uvcenters, fnums, uvs[loops])
+        denom = np.maximum(nverts, 1)[:,np.newaxis]
+        return centers/denom, (uvcenters/denom).tolist(), nverts
 
     #-------------------------------------------------------------
     #   Find starting point
     #-------------------------------------------------------------
 
-    def findStartingPoint(self, ob, neighbors, uvcenters):
+    def findStartingPoint(self, neighbors, uvcenters):
         types = dict([(n,[]) for n in range(1,5)])
         for fn,neighs in neighbors.items():
             nneighs = len(neighs)
             if nneighs not in types.keys():
                 print("  Face %d has %d neighbors" % (fn, nneighs))
-                #self.selectFaces(ob, [fn]+neighs)
+                #self.selectFaces([fn]+neighs)
                 return None,None,None,None
             types[nneighs].append(fn)
 
@@ -468,19 +434,19 @@ class DAZ_OT_MakeHair(DazPropsOperator, IsMesh, B.Hair):
             doublets.sort()
             if len(doublets) > 4:
                 print("  Has %d doublets" % len(doublets))
-                self.selectFaces(ob, [fn for _,fn in doublets])
+                self.selectFaces([fn for _,fn in doublets])
                 return None,None,None,None
             if len(doublets) < 4:
                 if len(doublets) == 2:
                     print("  Has %d doublets" % len(doublets))
-                    self.selectFaces(ob, neighbors.keys())
+                    self.selectFaces(list(neighbors.keys()))
                 return None,None,None,None
             first = doublets[0][1]
             corner = types[2]
             boundary = types[3]
             bulk = types[4]
 
-        return first, corner, boundary, bulk
+        return first, set(corner), set(boundary), set(bulk)
 
     #-------------------------------------------------------------
     #   Sort columns
@@ -543,7 +509,7 @@ class DAZ_OT_MakeHair(DazPropsOperator, IsMesh, B.Hair):
             if len(column) < length:
                 length = len(column)
                 short = True
-            hcoord = [centers[fn] for fn in column]
+            hcoord = centers[column]
             hcoords.append(hcoord)
         if short:
             hcoords = [hcoord[0:length] for hcoord in hcoords]
@@ -561,19 +527,16 @@ class DAZ_OT_MakeHair(DazPropsOperator, IsMesh, B.Hair):
         hum.data.materials.append(mat)
 
 
-    def quadsOnly(self, ob, faces):
-        for fn in faces:
-            f = ob.data.polygons[fn]
-            if len(f.vertices) != 4:
-                #print("  Face %d has %s corners" % (fn, len(f.vertices)))
-                self.nonquads.append(fn)
-                return False
+    def quadsOnly(self, faces, nverts):
+        nonquads = [fn for fn in faces if nverts[fn] != 4]
+        if nonquads:
+            self.nonquads += nonquads
+            return False
         return True
 
 
-    def selectFaces(self, ob, faces):
-        for fn in faces:
-            ob.data.polygons[fn].select = True
+    def selectFaces(self, faces):
+        self.selected[faces] = True
 
 # ---------------------------------------------------------------------
 #
@@ -598,6 +561,33 @@ def createSkullGroup(hum, skullType):
         return None
 
 
+def resampleStrands(strands, n):
+    """resampleStrands(strands, n):
+    Resample strands to n points each. Strands with the same number of
+    points are interpolated together as one array.
+    """
+    groups = {}
+    for idx,strand in enumerate(strands):
+        m = len(strand)
+        if m not in groups.keys():
+            groups[m] = []
+        groups[m].append(idx)
+
+    nstrands = [None for strand in strands]
+    for m,idxs in groups.items():
+        coords = np.array([strands[idx] for idx in idxs], dtype=np.float32)
+        step = (m-1)/(n-1)
+        x = np.arange(n-1)*step
+        j = np.floor(x + 1e-4).astype(np.int32)
+        eps = (x - j).astype(np.float32)[None,:,None]
+        ncoords = np.empty((len(idxs), n, 3), dtype=np.float32)
+        ncoords[:,:-1] = eps*coords[:,j+1] + (1-eps)*coords[:,j]
+        ncoords[:,-1] = coords[:,-1]
+        for idx,nco in zip(idxs, ncoords):
+            nstrands[idx] = nco
+    return nstrands
+
+
 def updateHair(context, ob, psys):
     if bpy.app.version < (2,80,0):
         bpy.ops.object.mode_set(mode='PARTICLE_EDIT')
@@ -1037,7 +1027,10 @@ class Pinning(B.Pinning):
         x1 = self.pinningX1
         w0 = self.pinningW0
         w1 = self.pinningW1
-        k = (w1-w0)/(x1-x0)
+        if x1 > x0:
+            k = (w1-w0)/(x1-x0)
+        else:
+            k = 0.0
         return x0,x1,w0,w1,k
 
     def draw(self, context):
@@ -1045,6 +1038,41 @@ class Pinning(B.Pinning):
         self.layout.prop(self, "pinningX1")
         self.layout.prop(self, "pinningW0")
         self.layout.prop(self, "pinningW1")
+        self.layout.prop(self, "pinningProfiles")
+
+
+    def getProfiles(self):
+        return [profile for profile in PinningProfiles if profile in self.pinningProfiles]
+
+
+    def getPinningWeights(self, xs, profile):
+        x0,x1,w0,w1,k = self.pinCoeffs()
+        xs = np.asarray(xs)
+        if x1 <= x0:
+            # Equal limits give a step from w0 to w1
+            return np.where(xs < x0, w0, w1)
+        t = np.clip((xs-x0)/(x1-x0), 0, 1)
+        if profile == 'SMOOTH':
+            t = t*t*(3-2*t)
+        elif profile == 'QUADRATIC':
+            t = t*t
+        return w0 + (w1-w0)*t
+
+
+PinningProfiles = {
+    'LINEAR' : "HairPinning",
+    'SMOOTH' : "HairPinningSmooth",
+    'QUADRATIC' : "HairPinningQuadratic",
+}
+
+
+def addPinningGroup(ob, gname, vnums, weights):
+    if gname in ob.vertex_groups.keys():
+        vgrp = ob.vertex_groups[gname]
+        ob.vertex_groups.remove(vgrp)
+    vgrp = ob.vertex_groups.new(name=gname)
+    addGroupWeights(vgrp, vnums, weights)
+    return vgrp
 
 
 class DAZ_OT_MeshAddPinning(DazPropsOperator, IsMesh, Pinning):
@@ -1055,23 +1083,23 @@ class DAZ_OT_MeshAddPinning(DazPropsOperator, IsMesh, Pinning):
 
     def run(self, context):
         ob = context.object
-        x0,x1,w0,w1,k = self.pinCoeffs()
-
-        if "HairPinning" in ob.vertex_groups.keys():
-            vgrp = ob.vertex_groups["HairPinning"]
-            ob.vertex_groups.remove(vgrp)
-
-        vgrp = ob.vertex_groups.new(name="HairPinning")
-        uvs = ob.data.uv_layers.active.data
-        m = 0
-        for f in ob.data.polygons:
-            for n,vn in enumerate(f.vertices):
-                x = 1-uvs[m+n].uv[1]
-                if x < x0:  w = w0
-                elif x > x1: w = w1
-                else: w = w0 + k*(x-x0)
-                vgrp.add([vn], w, 'REPLACE')
-            m += len(f.vertices)
+        me = ob.data
+        if me.uv_layers.active is None:
+            raise DazError("Mesh %s has no UV layer" % ob.name)
+        nloops = len(me.loops)
+        vnums = np.empty(nloops, dtype=np.int32)
+        me.loops.foreach_get("vertex_index", vnums)
+        uvs = np.empty(2*nloops, dtype=np.float32)
+        me.uv_layers.active.data.foreach_get("uv", uvs)
+        xs = 1 - uvs[1::2]
+        used = np.zeros(len(me.vertices), dtype=bool)
+        used[vnums] = True
+        verts = np.nonzero(used)[0]
+
+        for profile in self.getProfiles():
+            weights = np.full(len(me.vertices), -np.inf)
+            np.maximum.at(weights, vnums, self.getPinningWeights(xs, profile))
+            addPinningGroup(ob, PinningProfiles[profile], verts, weights[verts])
 
 
 class DAZ_OT_HairAddPinning(DazPropsOperator, IsMesh, Pinning):
@@ -1082,7 +1110,28 @@ class DAZ_OT_HairAddPinning(DazPropsOperator, IsMesh, Pinning):
 
     def run(self, context):
         ob = context.object
-        x0,x1,w0,w1,k = self.pinCoeffs()
+        profiles = self.getProfiles()
+        if len(profiles) != 1:
+            raise DazError("Strand hair takes exactly one pinning profile,\nbecause hair keys only have a single weight")
+        activateObject(context, ob)
+        bpy.ops.object.mode_set(mode='OBJECT')
+        for idx,psys in enumerate(ob.particle_systems):
+            if psys.settings.type != 'HAIR':
+                continue
+            ob.particle_systems.active_index = idx
+            psys = updateHair(context, ob, psys)
+            if len(psys.particles) == 0:
+                continue
+            # All strands in a particle system have the same number of keys,
+            # so the weights are computed once and set on every strand
+            nkeys = len(psys.particles[0].hair_keys)
+            xs = np.arange(nkeys)/max(nkeys-1, 1)
+            weights = self.getPinningWeights(xs, profiles[0]).astype(np.float32)
+            for hair in psys.particles:
+                hair.hair_keys.foreach_set("weight", weights)
+            updateHair(context, ob, psys)
+        bpy.ops.object.mode_set(mode='PARTICLE_EDIT')
+        bpy.ops.object.mode_set(mode='OBJECT')
 
 # ---------------------------------------------------------------------
 #   Initialize
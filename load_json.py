@@ -143,3 +143,103 @@ def leafList(data):
         if isinstance(elt, (list,dict)):
             return False
     return True
+
+#-------------------------------------------------------------
+#   Probe the first modifier of a DAZ file without decoding
+#   the whole file. Returns None if undecided.
+#-------------------------------------------------------------
+
+def probeModifier(filepath, maxbytes=1<<20):
+    import codecs
+    fp = None
+    try:
+        fp = gzip.open(filepath, 'rb')
+        fp.peek(1)
+    except (IOError, OSError):
+        if fp:
+            fp.close()
+        try:
+            fp = open(filepath, 'rb')
+        except IOError:
+            return None
+    decoder = codecs.getincrementaldecoder("utf_8_sig")(errors="replace")
+    string = ""
+    nbytes = 0
+    chunk = 1<<14
+    try:
+        while nbytes < maxbytes:
+            bytes = fp.read(chunk)
+            nbytes += len(bytes)
+            eof = (len(bytes) < chunk)
+            string += decoder.decode(bytes, final=eof)
+            header = scanFirstModifier(string, eof)
+            if header is not None:
+                return header
+            if eof:
+                return None
+            chunk *= 2
+    except (IOError, OSError, EOFError):
+        pass
+    finally:
+        fp.close()
+    return None
+
+
+def scanFirstModifier(string, eof):
+    import re
+    idx = string.find('"modifier_library"')
+    if idx < 0:
+        if eof:
+            return {"type" : None, "vertex_count" : None, "parent" : None}
+        return None
+    idx = string.find("[", idx)
+    if idx < 0:
+        return None
+    n = len(string)
+    i = idx+1
+    depth = 1
+    entry = {}
+    topkey = last = pending = None
+    while i < n:
+        c = string[i]
+        if c == '"':
+            j = i+1
+            while j < n and string[j] != '"':
+                if string[j] == '\\':
+                    j += 1
+                j += 1
+            if j >= n:
+                return None
+            last = string[i+1:j]
+            if pending == "parent":
+                entry["parent"] = last
+            pending = None
+            i = j+1
+            continue
+        elif c == ':':
+            if depth == 2:
+                topkey = pending = last
+                entry[topkey] = True
+            elif depth == 3 and topkey == "morph" and last == "vertex_count":
+                match = re.match(r"\s*(\d+)", string[i+1:i+32])
+                if match is None:
+                    return None
+                return {"type" : "morph",
+                        "vertex_count" : int(match.group(1)),
+                        "parent" : entry.get("parent")}
+        elif c in "{[":
+            depth += 1
+            pending = None
+        elif c in "}]":
+            depth -= 1
+            if depth == 1:
+                for key,type in [("morph", "morph"), ("formulas", "formula"), ("channel", "channel")]:
+                    if key in entry.keys():
+                        return {"type" : type,
+                                "vertex_count" : None,
+                                "parent" : entry.get("parent")}
+                entry = {}
+            elif depth == 0:
+                return {"type" : None, "vertex_count" : None, "parent" : None}
+        i += 1
+    return None
@@ -94,6 +94,10 @@ def getMainAsset(filepath, context, btn):
         showProgress(80 + int(idx*10/nmods), 100)
         idx += 1
         asset.build(context, inst)      # Builds morphs
+    from .modifier import applyMorphDisplacements, printMorphBuilds
+    if LS.applyMorphs:
+        applyMorphDisplacements()
+    printMorphBuilds()
     showProgress(90, 100)
 
     for asset,inst in main.nodes:
@@ -29,6 +29,7 @@
 import os
 import json
 import bpy
+import numpy as np
 from bpy.props import *
 from .utils import *
 from .error import *
@@ -352,123 +353,63 @@ class DAZ_OT_MergeGeograftsFast(DazOperator, MaterialMerger, IsMesh):
 
 
 
-        preservableVertexIndices = []
-        removableEdgeIndices = []
-        for aob in anatomies:                    
-
-            # those are the faces on geograft that daz is supposed to mask/hide/remove when the geograft is applied   
-            # all faces !!! included in the geograft boundaries/replaceable faces also the ones to be removed         
-            # but this is a complicated problem, if we delete the edges a bit later, it also shifts the faces count, so maybe we can't delete them?!? maybe later?!?
-            maskedFaceIndices = [ item.a for item in aob.data.DazMaskGroup ]
-
-            # but from those faces, we are going to get the vertices that makes them
-            # all vertices !!! included in the geograft boundaries/replaceable vertices also the ones to be removed
-            maskedVertexIndices = []
-            for findex in maskedFaceIndices:
-                vIndexArray = [cob.data.polygons[findex].vertices[i] for i in range(len(cob.data.polygons[findex].vertices))]  #there can be faces made from 3 or 4 vertices 
-                maskedVertexIndices.extend(vIndexArray)
-
-            # list of vertices that are merged in the body
-            mergingBodyVerticesList=[]
-            for item in aob.data.DazGraftGroup:
-                mergingBodyVerticesList.append(item.b)
-
-            # those are the vertices we should in theory to keep (those are not on the merging boundary)
-            preservableVertexIndices = []
-            for element in maskedVertexIndices:
-                if element not in mergingBodyVerticesList:
-                    preservableVertexIndices.append(element)
-
-
-
-            #preservableVertexIndices = maskedVertexIndices - mergingBodyVerticesList
-
-            for edge in cob.data.edges:
-                v1 = edge.vertices[0]
-                v2 = edge.vertices[1]
-                if v1 in maskedVertexIndices and v2 in maskedVertexIndices: #if both vertices of the edge are in the geograft merging/replaceable vertices list
-                    if v1 in mergingBodyVerticesList and v2 in mergingBodyVerticesList: #if both vertices of the edge are to be merged/replaced then ignore this edge
-                        continue
-                    if v1 in preservableVertexIndices and v2 in preservableVertexIndices: #this is the edge we want to keep in order to maintain the face (easy scaling)
-                        continue
-                    removableEdgeIndices.append(edge.index) # finally we find an edge that is not in the boundary and we dont want to keep
-
-
-
-        activateObject(context, cob)
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_mode(type="VERT")
-        bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.ops.mesh.select_mode(type="EDGE")
-        bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.ops.object.mode_set(mode='OBJECT')
-        for edgeIndex in removableEdgeIndices:
-            cob.data.edges[edgeIndex].select= True
-        bpy.ops.object.mode_set(mode='EDIT')
-        ##############################################################################################################
-        bpy.ops.mesh.delete(type='EDGE')                        # DELETE EDGE
-        ##############################################################################################################
-        bpy.ops.mesh.select_mode(type="VERT")
-        bpy.ops.object.mode_set(mode='OBJECT')
-
-        rvs = OrderedDict()
+        # Masks over the body vertices, and the body edges to remove
+        cme = cob.data
+        edgeVerts = np.empty(2*len(cme.edges), dtype=np.int32)
+        cme.edges.foreach_get("vertices", edgeVerts)
+        v1 = edgeVerts[0::2]
+        v2 = edgeVerts[1::2]
+        removable = np.zeros(len(cme.edges), dtype=bool)
+        grafts = []
         for aob in anatomies:
-            aobVertexCount = len(aob.data.vertices)
-            dazGraftGroupAfterJoinDict=OrderedDict()
-            for item in aob.data.DazGraftGroup:
-                print("original matching: {0}:{1}".format(item.a,item.b))
-                dazGraftGroupAfterJoinDict[item.a+len(cob.data.vertices)]=item.b                  #that -1 is very important, tricky!!!
-            for k, v in dazGraftGroupAfterJoinDict.items():
-                print("shifted matching: {0}:{1}".format(k,v))
-            rvs = reversed(dazGraftGroupAfterJoinDict.items())
-            for k, v in rvs:
-                print("reversed - {0}:{1}".format(k,v))
-
-            setSelected(aob, True)
+            # All vertices of the body faces replaced by the geograft, including the boundary
+            masked = np.zeros(ncverts, dtype=bool)
+            masked[getFaceVerts(cme, [item.a for item in aob.data.DazMaskGroup])] = True
+            # Boundary vertices of the body, merged with geograft vertices
+            pairs = np.array([(item.a, item.b) for item in aob.data.DazGraftGroup], dtype=np.int32).reshape((-1,2))
+            merging = np.zeros(ncverts, dtype=bool)
+            merging[pairs[:,1]] = True
+            # Interior vertices, collapsed but kept to maintain the faces
+            preserved = masked & ~merging
+            removable |= (masked[v1] & masked[v2] &
+                          ~(merging[v1] & merging[v2]) &
+                          ~(preserved[v1] & preserved[v2]))
+            grafts.append((aob, pairs, np.flatnonzero(preserved)))
+
+        # Join the geografts one at a time so the vertex offsets are known
+        merges = []
+        for aob,pairs,preserved in grafts:
+            offset = len(cob.data.vertices)
             activateObject(context, cob)
             setSelected(aob, True)
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.mesh.select_all(action='DESELECT')
-            bpy.ops.object.mode_set(mode='OBJECT')
-
             bpy.ops.object.join()
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.mesh.select_all(action='DESELECT')
-            bpy.ops.object.mode_set(mode='OBJECT')
-            counter= 0
-            print("rvs size...")
-            rvs = reversed(dazGraftGroupAfterJoinDict.items())
-            for k, v in rvs:
-                print("merging - {0}:{1}".format(k,v))
-                cob.data.vertices[v].select = True # this is the vertex added from the aob (anatomy)
-                cob.data.vertices[k].select = True # this is the original vertex from cob (body)
-                #
-                counter = counter+1
-                bpy.ops.object.mode_set(mode='EDIT')
-                #cob.data.vertices[v].co = cob.data.vertices[k].co 
-                bpy.ops.mesh.merge(type='CENTER', uvs=False)
-                #threshold = 0.001*cob.DazScale
-                #bpy.ops.mesh.remove_doubles(threshold=threshold)   
-                bpy.ops.mesh.select_all(action='DESELECT')             
-                bpy.ops.object.mode_set(mode='OBJECT')
-                #ob.data.update()
-            #
-            #range ( start , end , increment/decrement ) where start is inclusive , end is exclusive and increment can be any numbers and behaves like step  
-            #for k, v in rvs:
-            #    print("merging - {0}:{1}".format(k,v))
-            #    cob.data.vertices[k].select = True # this is the vertex added from the aob (anatomy)            
-            #for c in range (len(cob.data.vertices)-1, len(cob.data.vertices) - aobVertexCount -1,-1):
-            #    cob.data.vertices[c].select = True
-            #for k, v in reversed(dazGraftGroupAfterJoinDict.items()):
-            #    print("{0}:{1}".format(k,v))
-            #    cob.data.vertices[k].select = True # this is the vertex added from the aob (anatomy)
-            for p in preservableVertexIndices:
-                cob.data.vertices[p].select = True 
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.transform.resize(value=(0.0, 0.0, 0.0) )
-            bpy.ops.mesh.select_all(action='DESELECT')
+            merges.append((pairs[:,0] + offset, pairs[:,1], preserved))
+
+        # Collapse interior vertices, remove edges and weld the boundary in one pass
+        import bmesh
+        bm = bmesh.new()
+        bm.from_mesh(cob.data)
+        bm.verts.ensure_lookup_table()
+        bm.edges.ensure_lookup_table()
+        targetmap = {}
+        for grafted,body,preserved in merges:
+            if len(preserved) > 0:
+                verts = [bm.verts[vn] for vn in preserved]
+                center = sum([v.co for v in verts], Vector((0,0,0)))/len(verts)
+                for v in verts:
+                    v.co = center
+            for vn1,vn2 in zip(grafted, body):
+                targetmap[bm.verts[vn1]] = bm.verts[vn2]
+        edges = [bm.edges[en] for en in np.flatnonzero(removable)]
+        bmesh.ops.delete(bm, geom=edges, context='EDGES')
+        targetmap = dict([(v1,v2) for v1,v2 in targetmap.items() if v1.is_valid and v2.is_valid])
+        bmesh.ops.weld_verts(bm, targetmap=targetmap)
+        bm.to_mesh(cob.data)
+        bm.free()
+        cob.data.update()
+        print("Merged %d geografts: %d edges removed, %d vertices welded" %
+              (len(anatomies), len(edges), len(targetmap)))
 
-        bpy.ops.object.mode_set(mode='OBJECT')
         self.joinUvTextures(cob.data)
 
         newname = self.getUvName(cob.data)
@@ -1146,6 +1087,20 @@ class DAZ_OT_MergeGeografts(DazOperator, MaterialMerger, IsMesh):
         return None
 
 
+def getFaceVerts(me, fnums):
+    """getFaceVerts(me, fnums):
+    Indices of the vertices of the given faces, as an array.
+    """
+    nfaces = len(me.polygons)
+    totals = np.empty(nfaces, dtype=np.int32)
+    me.polygons.foreach_get("loop_total", totals)
+    loopVerts = np.empty(len(me.loops), dtype=np.int32)
+    me.loops.foreach_get("vertex_index", loopVerts)
+    selected = np.zeros(nfaces, dtype=bool)
+    selected[np.array(fnums, dtype=np.int32)] = True
+    return loopVerts[np.repeat(selected, totals)]
+
+
 def replaceNodeNames(mat, oldname, newname):
     texco = None
     for node in mat.node_tree.nodes:
@@ -29,6 +29,7 @@
 import bpy
 import collections
 import os
+import numpy as np
 
 from .asset import Asset
 from .utils import *
@@ -358,14 +359,10 @@ class SkinBinding(Modifier):
 
 
     def copyVertexGroups(self, ob, hdob, vmatch):
-        hdvgrps = {}
+        wmat = WeightMatrix(ob)
         for vgrp in ob.vertex_groups:
             hdvgrp = hdob.vertex_groups.new(name=vgrp.name)
-            hdvgrps[vgrp.index] = hdvgrp
-        for v in ob.data.vertices:
-            hdvn = v.index
-            for g in v.groups:
-                hdvgrps[g.group].add([hdvn], g.weight, 'REPLACE')
+            wmat.addWeights(hdvgrp, gn=vgrp.index)
 
 
     def getGeoRig(self, context, inst, geoname):
@@ -659,21 +656,54 @@ class Morph(FormulaAsset):
 
             if ob is None:
                 continue
-            elif LS.applyMorphs:
+            key = (getName(self.id), ob.name)
+            if key not in LS.morphBuilds.keys():
+                LS.morphBuilds[key] = [0, 0]
+            counts = LS.morphBuilds[key]
+            counts[0] += 1
+            if LS.applyMorphs:
                 self.addMorphToVerts(ob.data, cscale)
+            elif counts[1] > 0 and self.updateShapeKey(ob):
+                pass
             elif self.value > 0.0:
                 self.buildMorph(ob, cscale)
+                counts[1] += 1
         return self
 
 
+    def updateShapeKey(self, ob):
+        skeys = ob.data.shape_keys
+        sname = getName(self.id)
+        if skeys and sname in skeys.key_blocks.keys():
+            skey = skeys.key_blocks[sname]
+            skey.value = self.value
+            self.rna = (skey, ob, sname)
+            return True
+        return False
+
+
     def addMorphToVerts(self, me, cscale):
-        if self.value == 0.0:
+        disp,applied = getMorphDisplacement(me)
+        sname = getName(self.id)
+        value = self.value - applied.get(sname, 0.0)
+        if value == 0.0:
             return
+        scale = value * cscale * LS.scale
+        idxs,deltas = self.getDeltaArrays()
+        np.add.at(disp, idxs, scale*deltas)
+        applied[sname] = self.value
 
-        scale = self.value * cscale * LS.scale
-        for delta in self.deltas:
-            vn = delta[0]
-            me.vertices[vn].co += scale * d2bu(delta[1:])
+
+    def getDeltaArrays(self):
+        if not self.deltas:
+            return np.zeros(0, dtype=np.int32), np.zeros((0,3), dtype=np.float32)
+        data = np.array(self.deltas, dtype=np.float32)
+        idxs = data[:,0].astype(np.int32)
+        if GS.zup:
+            deltas = data[:,[1,3,2]] * np.array((1,-1,1), dtype=np.float32)
+        else:
+            deltas = data[:,1:4]
+        return idxs, deltas
 
 
     def buildMorph(self, ob, cscale, useSoftLimits=False, morphset=None, usePropDrivers=False):
@@ -696,18 +726,14 @@ class Morph(FormulaAsset):
 
 
     def buildShapeKey(self, ob, skey, cscale):
-        for v in ob.data.vertices:
-            skey.data[v.index].co = v.co
-
+        nverts = len(ob.data.vertices)
+        coords = np.empty(3*nverts, dtype=np.float32)
+        ob.data.vertices.foreach_get("co", coords)
+        coords = coords.reshape((nverts,3))
         scale = cscale * LS.scale
-        if GS.zup:
-            for delta in self.deltas:
-                vn = delta[0]
-                skey.data[vn].co += scale * d2b90u(delta[1:])
-        else:
-            for delta in self.deltas:
-                vn = delta[1]
-                skey.data[vn].co += scale * d2b00u(delta[1:])
+        idxs,deltas = self.getDeltaArrays()
+        coords[idxs] += scale*deltas
+        skey.data.foreach_set("co", coords.ravel())
 
 
     def rebuild(self, geonode, value):
@@ -726,3 +752,46 @@ class Morph(FormulaAsset):
                 if self.value > 0.0:
                     self.buildMorph(ob, cscale)
             #raise DazError("No such shapekey %s in %s" % (skey, ob))
+
+#-------------------------------------------------------------
+#   Applied morphs
+#   Accumulate all morph deltas and write each mesh once
+#-------------------------------------------------------------
+
+def getMorphDisplacement(me):
+    if me.name not in LS.morphDisplacements.keys():
+        disp = np.zeros((len(me.vertices),3), dtype=np.float32)
+        LS.morphDisplacements[me.name] = (me, disp, {})
+    _,disp,applied = LS.morphDisplacements[me.name]
+    return disp,applied
+
+
+def applyMorphDisplacements():
+    if not LS.morphDisplacements:
+        return
+    print("Applied morphs:")
+    for me,disp,applied in LS.morphDisplacements.values():
+        nverts = len(me.vertices)
+        coords = np.empty(3*nverts, dtype=np.float32)
+        me.vertices.foreach_get("co", coords)
+        coords += disp.ravel()
+        me.vertices.foreach_set("co", coords)
+        me.update()
+        print("  %s: %d morphs" % (me.name, len(applied)))
+        for name,value in applied.items():
+            print("    %-30s %.4f" % (name, value))
+    LS.morphDisplacements = {}
+
+
+def printMorphBuilds():
+    if not LS.morphBuilds:
+        return
+    nrequests = sum([counts[0] for counts in LS.morphBuilds.values()])
+    nbuilds = sum([counts[1] for counts in LS.morphBuilds.values()])
+    nshared = len([counts for counts in LS.morphBuilds.values() if counts[0] > 1])
+    print("Morphs: %d requests, %d shapekeys built, %d shared, %d rebuilds avoided" %
+          (nrequests, nbuilds, nshared, nrequests-len(LS.morphBuilds)))
+    if GS.verbosity > 2:
+        for key,counts in LS.morphBuilds.items():
+            if counts[0] > 1:
+                print("  %-30s %-20s %d" % (key[0], key[1], counts[0]))
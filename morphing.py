@@ -28,6 +28,7 @@
 
 import os
 import bpy
+import numpy as np
 from bpy.props import *
 from bpy_extras.io_utils import ImportHelper
 from mathutils import Vector
@@ -350,9 +351,10 @@ def getShortformList(item):
 
 theMorphFiles = {}
 theMorphNames = {}
+theMorphHeaders = {}
 
 def setupMorphPaths(scn, force):
-    global theMorphFiles, theMorphNames
+    global theMorphFiles, theMorphNames, theMorphHeaders
     from collections import OrderedDict
     from .asset import fixBrokenPath
     from .load_json import loadJson
@@ -361,6 +363,7 @@ def setupMorphPaths(scn, force):
         return
     theMorphFiles = {}
     theMorphNames = {}
+    theMorphHeaders = {}
 
     folder = os.path.join(os.path.dirname(__file__), "data/paths/")
     charPaths = {}
@@ -416,6 +419,21 @@ def setupMorphPaths(scn, force):
                             typeNames[fname] = name
 
 
+def getMorphHeader(filepath):
+    from .load_json import probeModifier
+    try:
+        mtime = os.path.getmtime(filepath)
+    except OSError:
+        return None
+    if filepath in theMorphHeaders.keys():
+        mtime0,header = theMorphHeaders[filepath]
+        if mtime0 == mtime:
+            return header
+    header = probeModifier(filepath)
+    theMorphHeaders[filepath] = (mtime, header)
+    return header
+
+
 def isRightType(fname, prefixes, includes, excludes):
     string = fname.lower()
     ok = False
@@ -523,8 +541,17 @@ class LoadMorph(PropFormulas, ShapeFormulas):
         if ob is None:
             return [],miss
 
-        struct = loadJson(filepath)
-        asset = parseAssetFile(struct)
+        header = getMorphHeader(filepath)
+        if header and header["type"] is None:
+            asset = None
+        elif (header and
+              header["type"] == "morph" and
+              header["vertex_count"] is not None and
+              not self.checkVertexCount(header["vertex_count"])):
+            return [],miss
+        else:
+            struct = loadJson(filepath)
+            asset = parseAssetFile(struct)
         props = []
         if asset is None:
             if GS.verbosity > 1:
@@ -538,13 +565,7 @@ class LoadMorph(PropFormulas, ShapeFormulas):
         skey = None
         prop = None
         if self.useShapekeys and isinstance(asset, Morph) and self.mesh and self.mesh.type == 'MESH':
-            if asset.vertex_count != len(self.mesh.data.vertices):
-                if GS.verbosity > 2:
-                    msg = ("Vertex count mismatch:\n  %d != %d" % (asset.vertex_count, len(self.mesh.data.vertices)))
-                    if self.suppressError:
-                        print(msg)
-                    else:
-                        raise DazError(msg)
+            if not self.checkVertexCount(asset.vertex_count):
                 return [],miss
             asset.buildMorph(self.mesh, ob.DazCharacterScale, self.useSoftLimits, morphset=self.morphset)
             skey,ob,sname = asset.rna
@@ -595,6 +616,20 @@ class LoadMorph(PropFormulas, ShapeFormulas):
             return [],miss
 
 
+    def checkVertexCount(self, nverts):
+        if not (self.useShapekeys and self.mesh and self.mesh.type == 'MESH'):
+            return True
+        elif nverts != len(self.mesh.data.vertices):
+            if GS.verbosity > 2:
+                msg = ("Vertex count mismatch:\n  %d != %d" % (nverts, len(self.mesh.data.vertices)))
+                if self.suppressError:
+                    print(msg)
+                else:
+                    raise DazError(msg)
+            return False
+        return True
+
+
     def getAllMorphs(self, namepaths, context):
         import time
         from .asset import clearAssets
@@ -626,6 +661,10 @@ class LoadMorph(PropFormulas, ShapeFormulas):
         others = self.buildOthers(missing)
         for prop in others:
             setActivated(self.rig, prop, True)
+        self.flattenShapekeyDrivers()
+        if GS.pruneShapekeys and self.mesh and self.mesh.type == 'MESH':
+            eps = GS.pruneThreshold * self.mesh.DazScale
+            pruneShapekeys(self.mesh, props, eps, 0.1*eps)
         missing = [key for key in missing.keys() if missing[key]]
         if missing:
             print("Failed to load the following %d morphs:\n%s\n" % (len(missing), missing))
@@ -1022,19 +1061,25 @@ class DAZ_OT_RemoveCategories(DazOperator, Selector, IsArmature, B.DeleteShapeke
 #------------------------------------------------------------------------
 
 def getShapeKeyCoords(ob):
-    coords = [v.co for v in ob.data.vertices]
+    nverts = len(ob.data.vertices)
+    verts = np.empty(3*nverts, dtype=np.float32)
+    ob.data.vertices.foreach_get("co", verts)
+    coords = verts.copy()
     skeys = []
     if ob.data.shape_keys:
+        scoords = np.empty(3*nverts, dtype=np.float32)
         for skey in ob.data.shape_keys.key_blocks[1:]:
             if abs(skey.value) > 1e-4:
-                coords = [co + skey.value*(skey.data[n].co - ob.data.vertices[n].co) for n,co in enumerate(coords)]
+                skey.data.foreach_get("co", scoords)
+                coords += skey.value*(scoords - verts)
             skeys.append(skey)
     return skeys,coords
 
 
 def applyMorphs(rig, props):
     for ob in rig.children:
-        basic = ob.data.shape_keys.key_blocks[0]
+        if ob.type != 'MESH' or not ob.data.shape_keys:
+            continue
         skeys,coords = getShapeKeyCoords(ob)
         for skey in skeys:
             path = 'key_blocks["%s"].value' % skey.name
@@ -1042,9 +1087,9 @@ def applyMorphs(rig, props):
             ob.shape_key_remove(skey)
         basic = ob.data.shape_keys.key_blocks[0]
         ob.shape_key_remove(basic)
-        for vn,co in enumerate(coords):
-            ob.data.vertices[vn].co = co
-    print("Morphs applied")
+        ob.data.vertices.foreach_set("co", coords)
+        ob.data.update()
+        print("%s: %d morphs applied" % (ob.name, len(skeys)))
 
 
 def getDrivingProps(rna, channel, props):
@@ -1063,6 +1108,118 @@ def removeDrivingProps(rig, props):
     for cat in rig.DazCategories:
         rig.DazCategories.remove(cat)
 
+#------------------------------------------------------------------------
+#   Prune shapekeys
+#------------------------------------------------------------------------
+
+def pruneShapekeys(ob, snames, threshold, noise):
+    from .driver import getShapekeyDriver
+    skeys = ob.data.shape_keys
+    if skeys is None:
+        return 0,0
+    nverts = len(ob.data.vertices)
+    refs = dict([(skey.relative_key.name, True) for skey in skeys.key_blocks])
+    bases = {}
+    removes = []
+    nzeroed = 0
+    for skey in skeys.key_blocks[1:]:
+        if ((snames is not None and skey.name not in snames) or
+            skey.name in refs.keys()):
+            continue
+        ref = skey.relative_key
+        if ref.name not in bases.keys():
+            bases[ref.name] = getCoordArray(ref.data)
+        base = bases[ref.name]
+        coords = getCoordArray(skey.data)
+        dists = np.linalg.norm(coords - base, axis=1)
+        if nverts == 0 or dists.max() < threshold:
+            removes.append(skey)
+        elif noise > 0:
+            small = (dists < noise) & (dists > 0)
+            nsmall = np.count_nonzero(small)
+            if nsmall:
+                coords[small] = base[small]
+                skey.data.foreach_set("co", coords.ravel())
+                nzeroed += nsmall
+
+    props = [skey.name for skey in removes]
+    for skey in removes:
+        if getShapekeyDriver(skeys, skey.name):
+            skey.driver_remove("value")
+        ob.shape_key_remove(skey)
+    nprops = removeUnusedMorphProps(getRigFromObject(ob), props)
+    saved = len(removes)*nverts*3*4
+    print("%s: Pruned %d shapekeys and %d morph properties, zeroed %d vertex offsets, saved %.2f MB" %
+          (ob.name, len(removes), nprops, nzeroed, saved/2**20))
+    return len(removes), saved
+
+
+def removeUnusedMorphProps(rig, props):
+    """removeUnusedMorphProps(rig, props):
+    Remove the rig properties among props that no longer drive any
+    shapekey, bone or other property, together with their own drivers,
+    morph set entries and custom categories.
+    """
+    if rig is None:
+        return 0
+    used = {}
+    for pb in rig.pose.bones:
+        for pgrps in [pb.DazLocProps, pb.DazRotProps, pb.DazScaleProps]:
+            for pg in pgrps:
+                used[pg.name] = True
+    rnas = [rig] + [ob.data.shape_keys for ob in rig.children if ob.type == 'MESH']
+    for rna in rnas:
+        if rna is None or rna.animation_data is None:
+            continue
+        for fcu in rna.animation_data.drivers:
+            for var in fcu.driver.variables:
+                trg = var.targets[0]
+                if (var.type == 'SINGLE_PROP' and
+                    trg.id == rig and
+                    not (rna == rig and trg.data_path == fcu.data_path)):
+                    used[trg.data_path[2:-2]] = True
+
+    dead = [prop for prop in props if prop in rig.keys() and prop not in used.keys()]
+    touched = {}
+    for prop in dead:
+        try:
+            rig.driver_remove('["%s"]' % prop)
+        except TypeError:
+            pass
+        removeFromPropGroups(rig, prop)
+        for cat in rig.DazMorphCats:
+            if prop in cat.morphs.keys():
+                removeFromPropGroup(cat.morphs, prop)
+                touched[cat.name] = True
+
+    removes = [cat.name for cat in rig.DazMorphCats if cat.name in touched.keys() and len(cat.morphs) == 0]
+    for catname in removes:
+        print("Remove category", catname)
+        removeFromPropGroup(rig.DazMorphCats, catname)
+    if dead and len(rig.DazMorphCats) == 0:
+        rig.DazCustomMorphs = False
+    return len(dead)
+
+
+class DAZ_OT_PruneShapekeys(DazPropsOperator, B.PruneShapekeysOptions, IsMesh):
+    bl_idname = "daz.prune_shapekeys"
+    bl_label = "Prune Shapekeys"
+    bl_description = "Remove shapekeys with negligible offsets, and zero out small vertex offsets"
+    bl_options = {'UNDO'}
+
+    def draw(self, context):
+        self.layout.prop(self, "threshold")
+        self.layout.prop(self, "noise")
+
+    def run(self, context):
+        nremoved = saved = 0
+        for ob in getSceneObjects(context):
+            if getSelected(ob) and ob.type == 'MESH':
+                nkeys,nbytes = pruneShapekeys(ob, None, self.threshold*ob.DazScale, self.noise*ob.DazScale)
+                nremoved += nkeys
+                saved += nbytes
+        print("Pruned %d shapekeys, saved %.2f MB" % (nremoved, saved/2**20))
+
 #------------------------------------------------------------------------
 #   Select and unselect all
 #------------------------------------------------------------------------
@@ -2005,6 +2162,7 @@ classes = [
     DAZ_OT_RemoveStandardMorphs,
     DAZ_OT_RemoveCustomMorphs,
     DAZ_OT_RemoveJCMs,
+    DAZ_OT_PruneShapekeys,
     DAZ_OT_RemoveAllShapekeyDrivers,
     DAZ_OT_AddShapekeyDrivers,
     DAZ_OT_RemoveShapekeyDrivers,
@@ -28,6 +28,7 @@
 
 import bpy
 import os
+import numpy as np
 from mathutils import Vector, Quaternion, Matrix
 from .error import *
 from .utils import *
@@ -42,6 +43,17 @@ class DBZInfo:
         self.objects = {}
         self.hdobjects = {}
         self.rigs = {}
+        self.names = {}
+        self.alternatives = {}
+
+
+    def buildIndex(self):
+        self.names = {}
+        self.alternatives = {}
+        for oname,data in self.objects.items():
+            if oname[:-2] not in self.alternatives.keys():
+                self.alternatives[oname[:-2]] = []
+            self.alternatives[oname[:-2]] += data
 
 
     def fitFigure(self, inst, takenfigs):
@@ -89,6 +101,12 @@ class DBZInfo:
 
 
     def tryGetName(self, name):
+        if name not in self.names.keys():
+            self.names[name] = self.findName(name)
+        return self.names[name]
+
+
+    def findName(self, name):
         replacements = [
             (" ", "_"),
             (" ", "-"),
@@ -106,11 +124,7 @@ class DBZInfo:
 
 
     def getAlternatives(self, nname):
-        alts = []
-        for oname,data in self.objects.items():
-            if nname == oname[:-2]:
-                alts.append(data)
-        return alts
+        return self.alternatives.get(nname, [])
 
 
 class DBZObject:
@@ -121,6 +135,164 @@ class DBZObject:
         self.matgroups = matgroups
         self.lod = lod
         self.center = center
+        self.offsets = None
+        self.uvfaces = None
+        self.mnums = None
+        self.filepath = None
+
+
+def makeHDObject(figure, center):
+    verts = d2bArray(figure["hd vertices"])
+    matgroups = []
+    if "hd material groups" in figure.keys():
+        matgroups = figure["hd material groups"]
+    hdobj = DBZObject(verts, figure["hd uvs"], figure["hd face verts"], matgroups, figure["subd level"], center)
+    hdobj.offsets = figure["hd face offsets"]
+    hdobj.uvfaces = figure["hd face uvs"]
+    hdobj.mnums = figure["hd face materials"]
+    return hdobj
+
+
+def getFlatFaces(faces):
+    from itertools import chain
+    nfaces = len(faces)
+    counts = np.fromiter((len(f) for f in faces), dtype=np.int32, count=nfaces)
+    flat = np.fromiter(chain.from_iterable(faces), dtype=np.int32, count=int(counts.sum()))
+    valid = (flat >= 0)
+    fnums = np.repeat(np.arange(nfaces, dtype=np.int32), counts)
+    offsets = np.zeros(nfaces+1, dtype=np.int32)
+    offsets[1:] = np.cumsum(np.bincount(fnums[valid], minlength=nfaces))
+    return flat[valid], offsets
+
+
+def packFigure(figure):
+    """packFigure(figure):
+    Convert the large lists of a figure to flat arrays: vertex and uv
+    coordinates, and HD faces split into vertex indices, face offsets,
+    uv indices and material numbers. The JSON lists are released as
+    soon as they are converted.
+    """
+    for key,dtype,size in [
+        ("vertices", np.float32, 3),
+        ("hd vertices", np.float32, 3),
+        ("hd uvs", np.float32, 2)]:
+        if key in figure.keys() and not isinstance(figure[key], np.ndarray):
+            figure[key] = np.array(figure[key], dtype=dtype).reshape((-1,size))
+    if "hd faces" in figure.keys():
+        hdfaces = figure.pop("hd faces")
+        figure["hd face verts"],figure["hd face offsets"] = getFlatFaces([f[0] for f in hdfaces])
+        figure["hd face uvs"],_ = getFlatFaces([f[1] for f in hdfaces])
+        figure["hd face materials"] = np.array([f[4] for f in hdfaces], dtype=np.int32)
+
+#------------------------------------------------------------------
+#   DBZ array cache
+#   A binary file next to the .dbz, with a JSON header followed by
+#   raw little-endian arrays. It is memory-mapped on later loads and
+#   ignored if the size or modification time of the .dbz changes.
+#------------------------------------------------------------------
+
+DbzCacheMagic = b"DAZDBZC1"
+
+def getDbzCachePath(filepath):
+    return filepath + ".cache"
+
+
+def getDbzSource(filepath):
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime]
+
+
+def saveDbzCache(filepath, struct):
+    import json
+    import struct as structmod
+    arrays = []
+    offset = 0
+    header = dict([(key,value) for key,value in struct.items() if key != "figures"])
+    header["source"] = getDbzSource(filepath)
+    header["figures"] = []
+    for figure in struct["figures"]:
+        hfigure = {}
+        for key,value in figure.items():
+            if isinstance(value, np.ndarray):
+                array = np.ascontiguousarray(value, dtype=value.dtype.newbyteorder("<"))
+                hfigure[key] = {"array": [offset, array.dtype.str, list(array.shape)]}
+                arrays.append(array)
+                offset += (array.nbytes + 15) & ~15
+            else:
+                hfigure[key] = value
+        header["figures"].append(hfigure)
+    hbytes = json.dumps(header).encode("utf-8")
+    start = (len(DbzCacheMagic) + 4 + len(hbytes) + 15) & ~15
+    # Write to a temporary file first, so an interrupted save never
+    # leaves a truncated cache behind
+    path = getDbzCachePath(filepath)
+    tmppath = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(tmppath, "wb") as fp:
+            fp.write(DbzCacheMagic)
+            fp.write(structmod.pack("<I", len(hbytes)))
+            fp.write(hbytes)
+            fp.write(bytes(start - fp.tell()))
+            for array in arrays:
+                fp.write(array.tobytes())
+                fp.write(bytes(-array.nbytes & 15))
+        os.replace(tmppath, path)
+    except OSError as err:
+        print("Could not save %s:\n  %s" % (path, err))
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        return
+    print("DBZ arrays saved in %s" % path)
+
+
+def loadDbzCache(filepath):
+    import mmap
+    import struct as structmod
+    path = getDbzCachePath(filepath)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as fp:
+        try:
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+    try:
+        header = readDbzCache(mm, filepath, path)
+    except (ValueError, KeyError, TypeError, structmod.error) as err:
+        # Also catches json.JSONDecodeError, a subclass of ValueError
+        print("DBZ array cache %s is corrupt:\n  %s" % (path, err))
+        return None
+    if header is not None:
+        print("DBZ arrays mapped from %s" % path)
+    return header
+
+
+def readDbzCache(mm, filepath, path):
+    import json
+    import struct as structmod
+    nmagic = len(DbzCacheMagic)
+    if mm[0:nmagic] != DbzCacheMagic:
+        return None
+    hlen = structmod.unpack("<I", mm[nmagic:nmagic+4])[0]
+    if nmagic + 4 + hlen > len(mm):
+        raise ValueError("Header extends past end of file")
+    header = json.loads(mm[nmagic+4:nmagic+4+hlen].decode("utf-8"))
+    if header.pop("source") != getDbzSource(filepath):
+        print("DBZ array cache %s is out of date" % path)
+        return None
+    start = (nmagic + 4 + hlen + 15) & ~15
+    for figure in header["figures"]:
+        for key,value in list(figure.items()):
+            if isinstance(value, dict) and "array" in value.keys():
+                offset,dtype,shape = value["array"]
+                dtype = np.dtype(dtype)
+                count = int(np.prod(shape))
+                if (offset < 0 or count < 0 or
+                    start + offset + count*dtype.itemsize > len(mm)):
+                    raise ValueError("Array %s extends past end of file" % key)
+                array = np.frombuffer(mm, dtype=dtype, count=count, offset=start+offset)
+                figure[key] = array.reshape(shape)
+    return header
 
 #------------------------------------------------------------------
 #   Load DBZ file
@@ -129,13 +301,21 @@ class DBZObject:
 def loadDbzFile(filepath):
     from .load_json import loadJson
     dbz = DBZInfo()
-    struct = loadJson(filepath)
-    if ("application" not in struct.keys() or
-        struct["application"] not in ["export_basic_data", "export_to_blender", "export_highdef_to_blender"]):
-        msg = ("The file\n" +
-               filepath + "           \n" +
-               "does not contain data exported from DAZ Studio")
-        raise DazError(msg)
+    struct = None
+    if GS.useDbzCache:
+        struct = loadDbzCache(filepath)
+    if struct is None:
+        struct = loadJson(filepath)
+        if ("application" not in struct.keys() or
+            struct["application"] not in ["export_basic_data", "export_to_blender", "export_highdef_to_blender"]):
+            msg = ("The file\n" +
+                   filepath + "           \n" +
+                   "does not contain data exported from DAZ Studio")
+            raise DazError(msg)
+        for figure in struct["figures"]:
+            packFigure(figure)
+        if GS.useDbzCache:
+            saveDbzCache(filepath, struct)
 
     for figure in struct["figures"]:
         if "num verts" in figure.keys() and figure["num verts"] == 0:
@@ -162,14 +342,9 @@ def loadDbzFile(filepath):
         if "hd vertices" in figure.keys():
             if name not in dbz.hdobjects.keys():
                 dbz.hdobjects[name] = []
-            verts = [d2b(vec) for vec in figure["hd vertices"]]
-            lod = figure["subd level"]
-            uvs = figure["hd uvs"]
-            faces = figure["hd faces"]
-            matgroups = []
-            if "hd material groups" in figure.keys():
-                matgroups = figure["hd material groups"]
-            dbz.hdobjects[name].append(DBZObject(verts, uvs, faces, matgroups, lod, center))
+            hdobj = makeHDObject(figure, center)
+            hdobj.filepath = filepath
+            dbz.hdobjects[name].append(hdobj)
 
         if "bones" not in figure.keys():
             continue
@@ -209,6 +384,7 @@ def loadDbzFile(filepath):
             restdata[bname] = (head, tail, orient, xyz, origin, wsmat)
             transforms[bname] = (rmat, head, rmat.to_euler(), (1,1,1))
 
+    dbz.buildIndex()
     return dbz
 
 #------------------------------------------------------------------
@@ -243,6 +419,7 @@ def fitToFile(filepath, nodes):
     taken = dict([(name,0) for name in dbz.objects.keys()])
     takenfigs = dict([(name,[]) for name in dbz.rigs.keys()])
     unfitted = []
+    stats = dict([(key,0) for key in ["exact", "renamed", "alternative", "mismatch", "unfitted"]])
     for node,inst in nodes:
         if inst is None:
             print("fitToFile inst is None:\n  ", None)
@@ -292,6 +469,7 @@ def fitToFile(filepath, nodes):
                 if not ok:
                     print(msg)
                     unfitted.append(node)
+                    stats["unfitted"] += 1
                 elif subsurfaced:
                     if len(verts) < len(geo.verts):
                         msg = ("Mismatch %s, %s: %d < %d" % (node.name, geo.name, len(base.verts), len(geo.verts)))
@@ -310,18 +488,29 @@ def fitToFile(filepath, nodes):
                                 geonode.highdef = highdef
                                 ok = True
                                 break
-                        if not ok:
+                        if ok:
+                            stats["alternative"] += 1
+                        else:
                             msg = ("Mismatch %s, %s: %d != %d" % (node.name, geo.name, len(base.verts), len(geo.verts)))
                             print(msg)
+                            stats["mismatch"] += 1
                     else:
                         geonode.verts = base.verts
                         geonode.center = base.center
                         geonode.highdef = highdef
+                        if nname == node.name:
+                            stats["exact"] += 1
+                        else:
+                            stats["renamed"] += 1
             elif len(geo.verts) == 0:
                 print("Zero verts:", node.name)
                 pass
             else:
                 unfitted.append(node)
+                stats["unfitted"] += 1
+
+    print("Fitted %d exact, %d renamed, %d alternative. %d mismatched, %d unfitted." %
+          (stats["exact"], stats["renamed"], stats["alternative"], stats["mismatch"], stats["unfitted"]))
 
     if unfitted:
         print("The following nodes were not found")
@@ -28,6 +28,7 @@
 
 import os
 import bpy
+import numpy as np
 from mathutils import Vector
 from .error import *
 from .tables import *
@@ -190,74 +191,85 @@ class Proxifier:
         self.seams = None
         self.faces = []
         self.matOffset = 10
-        self.origMnums = {}
+        self.origMnums = []
+        self.dirty = []
+        self.nfree = 0
         self.colorOnly = False
 
 
     def remains(self):
-        free = [t for t in self.dirty.values() if not t]
-        return len(free)
+        return self.nfree
+
+
+    def setDirty(self, fn, value=True):
+        # Keep a running count of free faces, so remains() is constant time
+        if self.dirty[fn] != value:
+            self.dirty[fn] = value
+            if value:
+                self.nfree -= 1
+            else:
+                self.nfree += 1
 
 
     def setup(self, ob, context):
-        self.faceverts, self.vertfaces, self.neighbors, self.seams = findSeams(ob)
+        findSeams(ob)
+        self.faceverts, self.vertfaces = getVertFaces(ob)
+        self.neighbors = getFaceNeighbors(ob)
+        self.seams = getSeamFaces(ob)
         if self.colorOnly:
             self.createMaterials()
-        self.origMnums = {}
-        for f in ob.data.polygons:
-            self.origMnums[f.index] = f.material_index
-            if self.colorOnly:
-                f.material_index = 0
+        mnums = np.empty(self.nfaces, dtype=np.int32)
+        ob.data.polygons.foreach_get("material_index", mnums)
+        self.origMnums = mnums.tolist()
+        if self.colorOnly:
+            ob.data.polygons.foreach_set("material_index", np.zeros(self.nfaces, dtype=np.int32))
 
         deselectEverything(ob, context)
-        self.dirty = dict([(fn,False) for fn in range(self.nfaces)])
-        for f in ob.data.polygons:
-            if f.hide:
-                self.dirty[f.index] = True
+        hidden = np.zeros(self.nfaces, dtype=bool)
+        ob.data.polygons.foreach_get("hide", hidden)
+        self.dirty = hidden.tolist()
+        self.nfree = self.nfaces - int(np.count_nonzero(hidden))
         newfaces = [[fn] for fn in range(self.nfaces) if self.dirty[fn]]
         printStatistics(ob)
         return newfaces
 
 
     def getConnectedComponents(self):
-        self.clusters = dict([(fn,-1) for fn in range(self.nfaces)])
-        self.refs = dict([(fn,fn) for fn in range(self.nfaces)])
-        cnum = 0
+        # Union-find on a parent array, with path halving
+        parents = list(range(self.nfaces))
+        for fn1 in range(self.nfaces):
+            for fn2 in self.neighbors[fn1]:
+                root1 = fn1
+                while parents[root1] != root1:
+                    parents[root1] = root1 = parents[parents[root1]]
+                root2 = fn2
+                while parents[root2] != root2:
+                    parents[root2] = root2 = parents[parents[root2]]
+                if root1 < root2:
+                    parents[root2] = root1
+                elif root2 < root1:
+                    parents[root1] = root2
+
+        # Roots are the smallest face in each component, so numbering
+        # them in face order sorts the components by their first face
+        self.clusters = [-1 for fn in range(self.nfaces)]
+        roots = {}
         for fn in range(self.nfaces):
-            cnums = []
-            for fn2 in self.neighbors[fn]:
-                cn = self.clusters[fn2]
-                if cn >= 0:
-                    cnums.append(self.deref(cn))
-            cnums.sort()
-            if cnums:
-                self.clusters[fn] = cn0 = cnums[0]
-                for cn in cnums[1:]:
-                    self.refs[cn] = cn0
-            else:
-                self.clusters[fn] = cn0 = cnum
-                cnum += 1
-
+            root = fn
+            while parents[root] != root:
+                root = parents[root]
+            if root not in roots.keys():
+                roots[root] = len(roots)
+            self.clusters[fn] = roots[root]
+
+        cnum = len(roots)
         comps = dict([(cn,[]) for cn in range(cnum)])
         taken = dict([(cn,False) for cn in range(cnum)])
         for fn in range(self.nfaces):
-            cn = self.clusters[fn]
-            cn = self.deref(cn)
-            comps[cn].append(fn)
-            self.clusters[fn] = cn
+            comps[self.clusters[fn]].append(fn)
         return comps,taken
 
 
-    def deref(self, cn):
-        cnums = []
-        while self.refs[cn] != cn:
-            cnums.append(cn)
-            cn = self.refs[cn]
-        for cn1 in cnums:
-            self.refs[cn1] = cn
-        return cn
-
-
     def getNodes(self):
         nodes = []
         comps,taken = self.getConnectedComponents()
@@ -281,7 +293,7 @@ class Proxifier:
 
         nodes = self.getNodes()
         for fn in nodes:
-            self.dirty[fn] = True
+            self.setDirty(fn)
         for fn in nodes:
             self.mergeFaces(fn, newfaces)
 
@@ -323,8 +335,8 @@ class Proxifier:
                     if (len(self.faceverts[fn2]) == 3 and
                         not self.dirty[fn2] and
                         fn2 not in self.seams[fn1]):
-                        self.dirty[fn1] = True
-                        self.dirty[fn2] = True
+                        self.setDirty(fn1)
+                        self.setDirty(fn2)
                         newface = [fn1,fn2]
                         newfaces.append(newface)
                         break
@@ -339,7 +351,7 @@ class Proxifier:
     def buildNewMesh(self, newfaces):
         from .geometry import makeNewUvloop
 
-        free = [[fn] for fn,t in self.dirty.items() if not t]
+        free = [[fn] for fn,t in enumerate(self.dirty) if not t]
         newfaces += free
         ob = self.object
         uvtex,uvloop,uvdata = getUvData(ob)
@@ -508,7 +520,6 @@ class Proxifier:
 
 
     def mergeNextFaces(self, face, newfaces):
-        me = self.object.data
         if len(face) < 2:
             return
         nextfaces = [face]
@@ -524,8 +535,6 @@ class Proxifier:
                             newface = self.mergeSide(fn0, fn1, newfaces, mn)
                             if newface:
                                 if len(newface) == 4:
-                                    for fn in newface:
-                                        me.polygons[fn].select = True
                                     nextfaces.append(newface)
                                 break
 
@@ -546,8 +555,8 @@ class Proxifier:
                     fn3 in self.seams[fn2]
                     ):
                     continue
-                self.dirty[fn2] = True
-                self.dirty[fn3] = True
+                self.setDirty(fn2)
+                self.setDirty(fn3)
                 newface = self.mergeFacePair([fn2,fn3], newfaces, mn)
                 return newface
         return None
@@ -555,14 +564,14 @@ class Proxifier:
 
     def mergeFaces(self, fn0, newfaces):
         newface = [fn0]
-        self.dirty[fn0] = True
+        self.setDirty(fn0)
         mn = self.origMnums[fn0]
         for fn1 in self.neighbors[fn0]:
             if (fn1 not in self.seams[fn0] and
                 not self.dirty[fn1] and
                 mn == self.origMnums[fn1]):
                 newface.append(fn1)
-                self.dirty[fn1] = True
+                self.setDirty(fn1)
                 break
         if len(newface) == 2:
             return self.mergeFacePair(newface, newfaces, mn)
@@ -580,7 +589,7 @@ class Proxifier:
                 not self.dirty[fn2] and
                 mn == self.origMnums[fn2]):
                 newface.append(fn2)
-                self.dirty[fn2] = True
+                self.setDirty(fn2)
                 break
 
         if len(newface) == 3:
@@ -592,12 +601,12 @@ class Proxifier:
                     not self.dirty[fn3] and
                     mn == self.origMnums[fn3]):
                     newface.append(fn3)
-                    self.dirty[fn3] = True
+                    self.setDirty(fn3)
                     break
 
         if len(newface) == 3:
             fn0,fn1,fn2 = newface
-            self.dirty[fn2] = False
+            self.setDirty(fn2, False)
             newface = [fn0,fn1]
 
         newfaces.append(newface)
@@ -651,7 +660,7 @@ class Proxifier:
         scn = context.scene
         deselectEverything(ob, context)
         self.faceverts, self.vertfaces = getVertFaces(ob)
-        self.neighbors = findNeighbors(range(self.nfaces), self.faceverts, self.vertfaces)
+        self.neighbors = getFaceNeighbors(ob)
         comps,taken = self.getConnectedComponents()
         for comp in comps.values():
             if random.random() > fraction:
@@ -993,54 +1002,91 @@ class DAZ_OT_SplitNgons(DazOperator, IsMesh):
 def findSeams(ob):
     print("Find seams", ob)
     #ob.data.materials.clear()
+    ob.data.edges.foreach_set("use_seam", getSeamEdges(ob))
+    print("Seams found")
 
-    faceverts,vertfaces = getVertFaces(ob)
-    nfaces = len(faceverts)
-    neighbors = findNeighbors(range(nfaces), faceverts, vertfaces)
-
-    texverts,texfaces = findTexVerts(ob, vertfaces)
-    _,texvertfaces = getVertFaces(ob, texverts, None, texfaces)
-    texneighbors = findNeighbors(range(nfaces), texfaces, texvertfaces)
-
-    seams = dict([(fn,[]) for fn in range(nfaces)])
-    for fn1,nn1 in neighbors.items():
-        for fn2 in nn1:
-            if (fn2 not in texneighbors[fn1]):
-                if fn1 in seams.keys():
-                    seams[fn1].append(fn2)
-
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_mode(type='EDGE')
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.mesh.mark_seam(clear=True)
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
-
-    for e in ob.data.edges:
-        vn1,vn2 = e.vertices
-        for fn1 in vertfaces[vn1]:
-            f1 = ob.data.polygons[fn1]
-            for fn2 in vertfaces[vn2]:
-                f2 = ob.data.polygons[fn2]
-                if (vn2 in f1.vertices and
-                    vn1 in f2.vertices and
-                    fn1 != fn2):
-                    if fn2 in seams[fn1]:
-                        e.select = True
-
-    _,vertedges = getVertEdges(ob)
-    _,edgefaces = getEdgeFaces(ob, vertedges)
-    for e in ob.data.edges:
-        if len(edgefaces[e.index]) != 2:
-            e.select = True
 
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.mark_seam(clear=False)
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
-
-    print("Seams found")
-    return  faceverts, vertfaces, neighbors,seams
+def getSeamFaces(ob):
+    """getSeamFaces(ob):
+    For each face, the list of faces that share an edge with it but
+    have different UVs along that edge.
+    """
+    def build():
+        _,faces1,faces2,uvseams = findEdgeSeams(ob)
+        seams = dict([(fn,[]) for fn in range(len(ob.data.polygons))])
+        for fn1,fn2 in zip(faces1[uvseams].tolist(), faces2[uvseams].tolist()):
+            if fn1 != fn2:
+                seams[fn1].append(fn2)
+                seams[fn2].append(fn1)
+        return seams
+
+    return getCachedTopology(ob, ("seams", getUvFingerPrint(ob)), build)
+
+
+def getSeamEdges(ob):
+    """getSeamEdges(ob):
+    Return a boolean array over the edges, true for edges that do not
+    have exactly two faces, and for edges where the two faces have
+    different UVs at either end of the edge.
+    """
+    return findEdgeSeams(ob)[0]
+
+
+def findEdgeSeams(ob):
+    # Shared by getSeamEdges and getSeamFaces, so the edge mask is only
+    # computed once per topology and UV layout
+    return getCachedTopology(ob, ("edgeseams", getUvFingerPrint(ob)), lambda: makeEdgeSeams(ob))
+
+
+def makeEdgeSeams(ob):
+    me = ob.data
+    nedges = len(me.edges)
+    nfaces = len(me.polygons)
+    nloops = len(me.loops)
+    vnums = np.empty(nloops, dtype=np.int32)
+    me.loops.foreach_get("vertex_index", vnums)
+    enums = np.empty(nloops, dtype=np.int32)
+    me.loops.foreach_get("edge_index", enums)
+    starts = np.empty(nfaces, dtype=np.int32)
+    me.polygons.foreach_get("loop_start", starts)
+    totals = np.empty(nfaces, dtype=np.int32)
+    me.polygons.foreach_get("loop_total", totals)
+
+    # Each loop starts the edge going to the next loop of the same face
+    fnums = np.repeat(np.arange(nfaces, dtype=np.int32), totals)
+    offsets = np.arange(nloops) - np.repeat(np.cumsum(totals)-totals, totals)
+    loops = np.repeat(starts, totals) + offsets
+    nexts = np.repeat(starts, totals) + (offsets+1) % np.repeat(totals, totals)
+    edges = enums[loops]
+    counts = np.bincount(edges, minlength=nedges)
+    seams = (counts != 2)
+
+    # The two sides of each edge with exactly two faces
+    order = np.argsort(edges, kind="stable")
+    sedges = edges[order]
+    pairs = np.nonzero((sedges[:-1] == sedges[1:]) & (counts[sedges[:-1]] == 2))[0]
+    first = order[pairs]
+    second = order[pairs+1]
+    faces1 = fnums[first]
+    faces2 = fnums[second]
+
+    uvlayer = me.uv_layers.active
+    if uvlayer is None:
+        return seams, faces1, faces2, np.zeros(len(pairs), dtype=bool)
+    uvs = np.empty(2*nloops, dtype=np.float32)
+    uvlayer.data.foreach_get("uv", uvs)
+    uvs = uvs.reshape((nloops,2))
+
+    # Order the UVs of each edge side by vertex number, so that the two
+    # sides of a shared edge can be compared directly
+    flip = (vnums[loops] > vnums[nexts])[:,np.newaxis]
+    uv0 = np.where(flip, uvs[nexts], uvs[loops])
+    uv1 = np.where(flip, uvs[loops], uvs[nexts])
+    dist0 = np.sum((uv0[first]-uv0[second])**2, axis=1)
+    dist1 = np.sum((uv1[first]-uv1[second])**2, axis=1)
+    uvseams = ((dist0 > 4e-8) | (dist1 > 4e-8))
+    seams[sedges[pairs]] |= uvseams
+    return seams, faces1, faces2, uvseams
 
 
 class DAZ_OT_FindSeams(DazOperator, IsMesh):
@@ -1090,8 +1136,8 @@ def applyShapeKeys(ob):
             ob.shape_key_remove(skey)
         skey = ob.data.shape_keys.key_blocks[0]
         ob.shape_key_remove(skey)
-        for v in ob.data.vertices:
-            v.co = coords[v.index]
+        ob.data.vertices.foreach_set("co", coords)
+        ob.data.update()
 
 
 class DAZ_OT_ApplyMorphs(DazOperator, IsMesh):
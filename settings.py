@@ -84,12 +84,16 @@ class GlobalSettings:
         self.propMax = 1.0
         self.useDazPropLimits = True
         self.useDazPropDefault = True
+        self.pruneShapekeys = False
+        self.pruneThreshold = 0.01
 
         self.useLockLoc = True
         self.useLimitLoc = True
         self.useConnect = True
 
         self.buildHighdef = True
+        self.useDbzCache = True
+        self.useHDCache = True
         self.strandsAsHair = True
         self.multipleHairMaterials = True
         self.addFaceDrivers = True
@@ -121,6 +125,8 @@ class GlobalSettings:
         "DazPropMax" : "propMax",
         "DazUsePropLimits" : "useDazPropLimits",
         "DazUsePropDefault" : "useDazPropDefault",
+        "DazPruneShapekeys" : "pruneShapekeys",
+        "DazPruneThreshold" : "pruneThreshold",
 
         "DazOrientMethod" : "orientMethod",
         "DazUseLegacyLocks" : "useLegacyLocks",
@@ -129,6 +135,8 @@ class GlobalSettings:
         "DazUseLimitLoc" : "useLimitLoc",
 
         "DazBuildHighdef" : "buildHighdef",
+        "DazUseDbzCache" : "useDbzCache",
+        "DazUseHDCache" : "useHDCache",
         "DazStrandsAsHair" : "strandsAsHair",
         "DazMultipleHairMaterials" : "multipleHairMaterials",
         "DazAddFaceDrivers" : "addFaceDrivers",
@@ -370,6 +378,8 @@ class LocalSettings:
         self.useMorph = False
         self.useFormulas = False
         self.applyMorphs = False
+        self.morphDisplacements = {}
+        self.morphBuilds = {}
         self.useAnimations = False
         self.useUV = False
         self.collection = None
@@ -26,8 +26,72 @@
 # either expressed or implied, of the FreeBSD Project.
 
 import bpy
+import numpy as np
+from mathutils import Vector
+from collections import OrderedDict
+
+#-------------------------------------------------------------
+#   Topology cache
+#   Derived topology is cached per mesh outside bpy data, keyed
+#   by the mesh pointer and checked against a fingerprint of the
+#   element counts and the loop and edge arrays. Only plain Python
+#   data is cached, never references to mesh elements.
+#-------------------------------------------------------------
+
+theTopologies = OrderedDict()
+theMaxTopologies = 8
+
+def getTopologyFingerPrint(ob):
+    import hashlib
+    from .finger import getFingerPrint
+    me = ob.data
+    sha = hashlib.sha1()
+    for data,attr,size in [(me.loops, "vertex_index", 1), (me.edges, "vertices", 2)]:
+        array = np.empty(size*len(data), dtype=np.int32)
+        data.foreach_get(attr, array)
+        sha.update(array.tobytes())
+    return "%s-%s" % (getFingerPrint(ob), sha.hexdigest())
+
+
+def getUvFingerPrint(ob):
+    import hashlib
+    uvlayer = ob.data.uv_layers.active
+    if uvlayer is None:
+        return None
+    uvs = np.empty(2*len(uvlayer.data), dtype=np.float32)
+    uvlayer.data.foreach_get("uv", uvs)
+    return "%s-%s" % (uvlayer.name, hashlib.sha1(uvs.tobytes()).hexdigest())
+
+
+def getCachedTopology(ob, key, build):
+    ptr = ob.data.as_pointer()
+    finger = getTopologyFingerPrint(ob)
+    if ptr in theTopologies.keys() and theTopologies[ptr][0] == finger:
+        cache = theTopologies.pop(ptr)[1]
+    else:
+        cache = {}
+    theTopologies[ptr] = (finger, cache)
+    while len(theTopologies) > theMaxTopologies:
+        theTopologies.popitem(last=False)
+    if key not in cache.keys():
+        cache[key] = build()
+    return cache[key]
+
+
+def clearTopologies():
+    theTopologies.clear()
+
+#-------------------------------------------------------------
+#   Tables
+#-------------------------------------------------------------
 
 def getVertFaces(ob, verts=None, faces=None, faceverts=None):
+    if ob and verts is None and faces is None and faceverts is None:
+        return getCachedTopology(ob, "vertfaces", lambda: makeVertFaces(ob))
+    return makeVertFaces(ob, verts, faces, faceverts)
+
+
+def makeVertFaces(ob, verts=None, faces=None, faceverts=None):
     if verts is None:
         verts = range(len(ob.data.vertices))
     if faces is None:
@@ -120,6 +184,25 @@ def findNeighbors(faces, faceverts, vertfaces):
     return neighbors
 
 
+def getFaceNeighbors(ob):
+    def build():
+        faceverts,vertfaces = getVertFaces(ob)
+        return findNeighbors(range(len(faceverts)), faceverts, vertfaces)
+
+    return getCachedTopology(ob, "neighbors", build)
+
+
+def getTexNeighbors(ob):
+    def build():
+        faceverts,vertfaces = getVertFaces(ob)
+        texverts,texfaces = findTexVerts(ob, vertfaces)
+        _,texvertfaces = getVertFaces(ob, texverts, None, texfaces)
+        texneighbors = findNeighbors(range(len(faceverts)), texfaces, texvertfaces)
+        return texverts, texfaces, texneighbors
+
+    return getCachedTopology(ob, ("texneighbors", getUvFingerPrint(ob)), build)
+
+
 def removeDuplicates(face):
     vn1 = face[0]
     nface = [vn1]
@@ -145,22 +228,26 @@ def duplicates(face):
 #-------------------------------------------------------------
 
 def findTexVerts(ob, vertfaces):
-    nfaces = len(ob.data.polygons)
-    touches = dict([(fn,[]) for fn in range(nfaces)])
-    for f1 in ob.data.polygons:
-        fn1 = f1.index
-        for vn in f1.vertices:
-            for fn2 in vertfaces[vn]:
-                if fn1 != fn2:
-                    touches[fn1].append(fn2)
-
-    uvs = ob.data.uv_layers.active.data
-    uvindices = {}
-    m = 0
-    for f in ob.data.polygons:
-        nv = len(f.vertices)
-        uvindices[f.index] = range(m, m+nv)
-        m += nv
+    me = ob.data
+    nfaces = len(me.polygons)
+    nloops = len(me.loops)
+    faceverts,_ = getVertFaces(ob)
+    touches = {}
+    for fn1 in range(nfaces):
+        touched = set()
+        for vn in faceverts[fn1]:
+            touched.update(vertfaces[vn])
+        touched.discard(fn1)
+        touches[fn1] = sorted(touched)
+
+    uvs = np.empty(2*nloops, dtype=np.float32)
+    me.uv_layers.active.data.foreach_get("uv", uvs)
+    uvs = uvs.reshape((nloops,2)).tolist()
+    starts = np.empty(nfaces, dtype=np.int32)
+    me.polygons.foreach_get("loop_start", starts)
+    totals = np.empty(nfaces, dtype=np.int32)
+    me.polygons.foreach_get("loop_total", totals)
+    uvindices = dict([(fn, range(m, m+nv)) for fn,m,nv in zip(range(nfaces), starts.tolist(), totals.tolist())])
 
     texverts = {}
     texfaces = {}
@@ -168,16 +255,14 @@ def findTexVerts(ob, vertfaces):
     vts = {}
     for fn1 in range(nfaces):
         texfaces[fn1] = texface = []
-        touches[fn1].sort()
         for m1 in uvindices[fn1]:
-            test = False
             matched = False
-            uv1 = uvs[m1].uv
+            u1,v1 = uvs[m1]
             for fn2 in touches[fn1]:
                 if fn2 < fn1:
                     for m2 in uvindices[fn2]:
-                        uv2 = uvs[m2].uv
-                        if (uv1-uv2).length < 2e-4:
+                        u2,v2 = uvs[m2]
+                        if (u1-u2)*(u1-u2) + (v1-v2)*(v1-v2) < 4e-8:
                             if m2 < m1:
                                 vts[m1] = vts[m2]
                             else:
@@ -186,7 +271,7 @@ def findTexVerts(ob, vertfaces):
                             #break
             if not matched:
                 vts[m1] = vt
-                texverts[vt] = uvs[m1].uv
+                texverts[vt] = Vector(uvs[m1])
                 vt += 1
             texface.append(vts[m1])
     return texverts, texfaces
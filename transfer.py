@@ -26,7 +26,9 @@
 # either expressed or implied, of the FreeBSD Project.
 
 import os
+import re
 import bpy
+import numpy as np
 from .error import *
 from .utils import *
 from .morphing import Selector
@@ -48,50 +50,56 @@ class MorphTransferer(Selector, B.TransferOptions):
 
     def run(self, context):
         import time
+        from .asset import setDazPaths
         t1 = time.perf_counter()
         hum = context.object
         if not hum.data.shape_keys:
             raise DazError("Cannot transfer because object    \n%s has no shapekeys   " % (hum.name))
-        for clo in self.getClothes(hum, context):
-            self.transferMorphs(hum, clo, context)
+        scn = context.scene
+        setDazPaths(scn)
+        clothes = self.getClothes(hum, context)
+        for clo in clothes:
+            if (hum.location != clo.location or
+                hum.rotation_euler != clo.rotation_euler or
+                hum.scale != clo.scale):
+                msg = "Cannot transfer morphs between meshes       \nwith different object transformations."
+                raise DazError(msg)
+
+        snames = self.getSelectedProps(scn)
+        self.humCoords = getCoordArray(hum.data.vertices)
+        self.humDeltas = {}
+        self.morphRegions = {}
+        for sname in snames:
+            self.getMorphRegion(hum, hum.data.shape_keys.key_blocks[sname])
+        garments = []
+        for clo in clothes:
+            garment = Garment(hum, clo)
+            self.loadMorphs(hum, garment, snames, context)
+            garments.append(garment)
+        self.transferDeltas(hum, garments)
+        for garment in garments:
+            self.finishGarment(garment)
+            print("  %s: %d transferred, %d ignored, %.2f seconds" %
+                (garment.name, garment.ntransferred, len(garment.ignored), garment.time))
         t2 = time.perf_counter()
         print("Morphs transferred in %.1f seconds" % (t2-t1))
 
 
-    def transferMorphs(self, hum, clo, context):
-        from .driver import getShapekeyDriver, copyDriver
-        from .asset import setDazPaths
-
-        if (hum.location != clo.location or
-            hum.rotation_euler != clo.rotation_euler or
-            hum.scale != clo.scale):
-            msg = "Cannot transfer morphs between meshes       \nwith different object transformations."
-            raise DazError(msg)
-        startProgress("Transfer morphs %s => %s" %(hum.name, clo.name))
+    def loadMorphs(self, hum, garment, snames, context):
+        # Morphs that are culled or found as .dsf files are handled here.
+        # The rest are left in garment.pending for transferDeltas.
+        clo = garment.clo
         scn = context.scene
-        setDazPaths(scn)
         setActiveObject(context, clo)
         if not clo.data.shape_keys:
-            basic = clo.shape_key_add(name="Basic")
-        else:
-            basic = None
-        hskeys = hum.data.shape_keys
+            garment.basic = clo.shape_key_add(name="Basic")
         if hum.active_shape_key_index < 0:
             hum.active_shape_key_index = 0
         clo.active_shape_key_index = 0
 
-        snames = self.getSelectedProps(scn)
-        nskeys = len(snames)
-        for idx,sname in enumerate(snames):
-            showProgress(idx, nskeys)
-            hskey = hskeys.key_blocks[sname]
-
-            if self.useDriver:
-                fcu = getShapekeyDriver(hskeys, sname)
-            else:
-                fcu = None
-
-            if self.ignoreMorph(hum, clo, hskey):
+        for sname in snames:
+            if garment.ignoreMorph(self.morphRegions[sname]):
+                garment.ignored.add(sname)
                 print(" 0", sname)
                 continue
 
@@ -99,7 +107,6 @@ class MorphTransferer(Selector, B.TransferOptions):
                 cskey = clo.data.shape_keys.key_blocks[sname]
                 clo.shape_key_remove(cskey)
 
-            cskey = None
             path = self.getMorphPath(sname, clo, scn)
             if path is not None:
                 from .morphing import LoadShapekey
@@ -108,25 +115,81 @@ class MorphTransferer(Selector, B.TransferOptions):
                 loader.errors = {}
                 loader.getSingleMorph(sname, path, scn)
                 if sname in clo.data.shape_keys.key_blocks.keys():
-                    cskey = clo.data.shape_keys.key_blocks[sname]
+                    print(" *", sname)
+                    self.copyMorphSettings(hum, clo, sname)
+                    continue
+            garment.pending.append(sname)
+
+
+    def transferDeltas(self, hum, garments):
+        # One task per garment computes the clothing deltas of its pending
+        # morphs. The tasks only do numpy work, and hand their results to
+        # the main thread through a bounded queue, so the shapekeys are
+        # written here as soon as they are ready and only a few delta
+        # arrays are alive at any time.
+        from concurrent.futures import ThreadPoolExecutor
+        import queue
+        import threading
+        garments = [garment for garment in garments if garment.pending]
+        if not garments:
+            return
+        ngarms = len(garments)
+        nthreads = min(ngarms, os.cpu_count() or 1)
+        results = queue.Queue(maxsize=2*nthreads)
+        stop = threading.Event()
+        total = sum([len(garment.pending) for garment in garments])
+        startProgress("Transfer morphs from %s to %d meshes" % (hum.name, ngarms))
+        with ThreadPoolExecutor(max_workers=nthreads) as pool:
+            futures = [pool.submit(garment.computeDeltas, self.humDeltas, len(self.humCoords), results, stop)
+                       for garment in garments]
+            try:
+                ndone = n = 0
+                while ndone < ngarms:
+                    garment,sname,cdeltas = results.get()
+                    if sname is None:
+                        ndone += 1
+                        continue
+                    showProgress(n, total)
+                    n += 1
+                    self.writeMorph(hum, garment, sname, cdeltas)
+            finally:
+                stop.set()
+            for future in futures:
+                future.result()
+
+
+    def writeMorph(self, hum, garment, sname, cdeltas):
+        clo = garment.clo
+        if self.autoTransfer(clo, sname, cdeltas):
+            cskey = clo.data.shape_keys.key_blocks[sname]
+            garment.ntransferred += 1
+            print(" +", sname)
+            if not self.ignoreRigidity:
+                if garment.rigidity is None:
+                    garment.rigidity = Rigidity(clo)
+                garment.rigidity.correct(cskey)
+            self.copyMorphSettings(hum, clo, sname)
+        else:
+            print(" -", sname)
 
-            if cskey:
-                print(" *", sname)
-            elif self.autoTransfer(hum, clo, hskey):
-                cskey = clo.data.shape_keys.key_blocks[sname]
-                print(" +", sname)
-                if cskey and not self.ignoreRigidity:
-                    correctForRigidity(clo, cskey)
-
-            if cskey:
-                cskey.slider_min = hskey.slider_min
-                cskey.slider_max = hskey.slider_max
-                cskey.value = hskey.value
-                if fcu is not None:
-                    copyDriver(fcu, cskey)
-            else:
-                print(" -", sname)
 
+    def copyMorphSettings(self, hum, clo, sname):
+        from .driver import getShapekeyDriver, copyDriver
+        hskeys = hum.data.shape_keys
+        hskey = hskeys.key_blocks[sname]
+        cskey = clo.data.shape_keys.key_blocks[sname]
+        cskey.slider_min = hskey.slider_min
+        cskey.slider_max = hskey.slider_max
+        cskey.value = hskey.value
+        if self.useDriver:
+            fcu = getShapekeyDriver(hskeys, sname)
+            if fcu is not None:
+                copyDriver(fcu, cskey)
+
+
+    def finishGarment(self, garment):
+        clo = garment.clo
+        basic = garment.basic
         if (basic and
             len(clo.data.shape_keys.key_blocks) == 1 and
             clo.data.shape_keys.key_blocks[0] == basic):
@@ -134,89 +197,34 @@ class MorphTransferer(Selector, B.TransferOptions):
             clo.shape_key_remove(basic)
 
 
-    def autoTransfer(self, hum, clo, hskey):
-        hverts = hum.data.vertices
-        cverts = clo.data.vertices
-        eps = 1e-4
-        facs = {0:1.0, 1:1.0, 2:1.0}
-        offsets = {0:0.0, 1:0.0, 2:0.0}
-        for n,vgname in enumerate(["_trx", "_try", "_trz"]):
-            coord = [data.co[n] - hverts[j].co[n] for j,data in enumerate(hskey.data)]
-            if min(coord) == max(coord):
-                fac = 1.0
-            else:
-                fac = 1.0/(max(coord)-min(coord))
-            facs[n] = fac
-            offs = offsets[n] = min(coord)
-            weights = [fac*(co-offs) for co in coord]
-
-            vgrp = hum.vertex_groups.new(name=vgname)
-            for vn,w in enumerate(weights):
-                vgrp.add([vn], w, 'REPLACE')
-
-            mod = clo.modifiers.new(vgname, 'DATA_TRANSFER')
-            for i in range(len(clo.modifiers)-1):
-                bpy.ops.object.modifier_move_up(modifier=mod.name)
-            mod.object = hum
-            mod.use_vert_data = True
-            #'TOPOLOGY', 'NEAREST', 'EDGE_NEAREST', 'EDGEINTERP_NEAREST',
-            # 'POLY_NEAREST', 'POLYINTERP_NEAREST', 'POLYINTERP_VNORPROJ'
-            mod.vert_mapping = 'POLYINTERP_NEAREST'
-            mod.data_types_verts = {'VGROUP_WEIGHTS'}
-            mod.layers_vgroup_select_src = vgname
-            mod.mix_mode = 'REPLACE'
-            bpy.ops.object.datalayout_transfer(modifier=mod.name)
-            bpy.ops.object.modifier_apply(modifier=mod.name)
-            hum.vertex_groups.remove(vgrp)
-
-        coords = []
-        isZero = True
-        for n,vgname in enumerate(["_trx", "_try", "_trz"]):
-            vgrp = clo.vertex_groups[vgname]
-            weights = [[g.weight for g in v.groups if g.group == vgrp.index][0] for v in clo.data.vertices]
-            fac = facs[n]
-            offs = offsets[n]
-            coord = [cverts[j].co[n] + w/fac + offs for j,w in enumerate(weights)]
-            coords.append(coord)
-            wmax = max(weights)/fac + offs
-            wmin = min(weights)/fac + offs
-            if abs(wmax) > eps or abs(wmin) > eps:
-                isZero = False
-            clo.vertex_groups.remove(vgrp)
-
-        if isZero:
+    def autoTransfer(self, clo, sname, cdeltas):
+        if cdeltas is None:
             return False
-
-        cskey = clo.shape_key_add(name=hskey.name)
+        cskey = clo.shape_key_add(name=sname)
+        coords = getCoordArray(clo.data.vertices) + cdeltas
         if self.useSelectedOnly:
-            verts = clo.data.vertices
-            for n in range(3):
-                for j,x in enumerate(coords[n]):
-                    if verts[j].select:
-                        cskey.data[j].co[n] = x
-        else:
-            for n in range(3):
-                for j,x in enumerate(coords[n]):
-                    cskey.data[j].co[n] = x
-
+            nverts = len(clo.data.vertices)
+            selected = np.zeros(nverts, dtype=bool)
+            clo.data.vertices.foreach_get("select", selected)
+            coords[~selected] = getCoordArray(cskey.data)[~selected]
+        cskey.data.foreach_set("co", coords.ravel())
         return True
 
 
-    def ignoreMorph(self, hum, clo, hskey):
+    def getMorphRegion(self, hum, hskey):
+        # The threshold only decides the bounding box used for culling.
+        # Transferred morphs always use the full deltas.
+        if hskey.name in self.morphRegions.keys():
+            return self.morphRegions[hskey.name]
         eps = 0.01 * hum.DazScale   # 0.1 mm
-        hverts = [v.index for v in hum.data.vertices if (hskey.data[v.index].co - v.co).length > eps]
-        for j in range(3):
-            xclo = [v.co[j] for v in clo.data.vertices]
-            # xkey = [hskey.data[vn].co[j] for vn in hverts]
-            xkey = [hum.data.vertices[vn].co[j] for vn in hverts]
-            if xclo and xkey:
-                minclo = min(xclo)
-                maxclo = max(xclo)
-                minkey = min(xkey)
-                maxkey = max(xkey)
-                if minclo > maxkey or maxclo < minkey:
-                    return True
-        return False
+        deltas = getCoordArray(hskey.data) - self.humCoords
+        dists = np.einsum("ij,ij->i", deltas, deltas)
+        moved = np.flatnonzero(dists > 0)
+        self.humDeltas[hskey.name] = (moved, deltas[moved])
+        hverts = np.flatnonzero(dists > eps*eps)
+        region = getCoordBounds(self.humCoords[hverts])
+        self.morphRegions[hskey.name] = region
+        return region
 
 
     def getClothes(self, hum, context):
@@ -228,7 +236,7 @@ class MorphTransferer(Selector, B.TransferOptions):
 
 
     def getMorphPath(self, sname, ob, scn):
-        from .fileutils import getFolder
+        from .fileutils import getFolder, findFileRecursive
         file = sname + ".dsf"
         folder = getFolder(ob, scn, ["Morphs/"])
         if folder:
@@ -237,64 +245,250 @@ class MorphTransferer(Selector, B.TransferOptions):
             return None
 
 
-def findFileRecursive(folder, tfile):
-    for file in os.listdir(folder):
-        path = os.path.join(folder, file)
-        if file == tfile:
-            return path
-        elif os.path.isdir(path):
-            tpath = findFileRecursive(path, tfile)
-            if tpath:
-                return tpath
-    return None
+#----------------------------------------------------------
+#   Garment
+#   Surface map, bounds and pending morphs of one garment.
+#   computeDeltas does not touch bpy data and runs in a thread.
+#----------------------------------------------------------
+
+class Garment:
+    def __init__(self, hum, clo):
+        self.clo = clo
+        self.name = clo.name
+        self.surfaceMap = getSurfaceMap(hum, clo)
+        self.bounds = getCoordBounds(getCoordArray(clo.data.vertices))
+        self.basic = None
+        self.pending = []
+        self.ignored = set()
+        self.ntransferred = 0
+        self.rigidity = None
+        self.time = 0.0
+
+
+    def computeDeltas(self, humDeltas, nhverts, results, stop):
+        import time
+        t1 = time.perf_counter()
+        try:
+            for sname in self.pending:
+                if stop.is_set():
+                    break
+                hverts,hdeltas = humDeltas[sname]
+                deltas = np.zeros((nhverts,3), dtype=np.float32)
+                deltas[hverts] = hdeltas
+                putResult(results, (self, sname, self.getDeltas(deltas)), stop)
+        finally:
+            self.time = time.perf_counter() - t1
+            putResult(results, (self, None, None), stop)
+
+
+    def getDeltas(self, hdeltas):
+        eps = 1e-4
+        cdeltas = self.surfaceMap.transfer(hdeltas)
+        if len(cdeltas) > 0 and np.abs(cdeltas).max() > eps:
+            return cdeltas
+        return None
+
+
+    def ignoreMorph(self, region):
+        if region is None or self.bounds is None:
+            return False
+        minclo,maxclo = self.bounds
+        minkey,maxkey = region
+        return bool(np.any(minclo > maxkey) or np.any(maxclo < minkey))
+
+
+def putResult(results, result, stop):
+    # Give up if the main thread has stopped reading results
+    import queue
+    while not stop.is_set():
+        try:
+            results.put(result, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+#----------------------------------------------------------
+#   Surface correspondence
+#   Each clothing vertex is mapped to the nearest point on the
+#   human surface, given by a triangle and barycentric weights.
+#----------------------------------------------------------
+
+class SurfaceMap:
+    def __init__(self, hum, clo, hash=None):
+        if hash is None:
+            hash = getSurfaceMapHash(hum, clo)
+        self.hash = hash
+        self.indices = self.weights = None
+
+
+    def build(self, hum, clo):
+        import time
+        t1 = time.perf_counter()
+        self.indices, self.weights = self.getNearestTriangles(hum, clo)
+        t2 = time.perf_counter()
+        print("Surface map %s => %s computed in %.1f seconds" % (hum.name, clo.name, t2-t1))
+
+
+    def store(self, hum, clo):
+        if "_DazSurfaceMap" not in clo.keys():
+            clo["_DazSurfaceMap"] = {}
+        clo["_DazSurfaceMap"][hum.name] = {
+            "hash" : self.hash,
+            "indices" : self.indices.ravel().tolist(),
+            "weights" : self.weights.ravel().tolist(),
+        }
+
+
+    def restore(self, hum, clo):
+        if "_DazSurfaceMap" not in clo.keys():
+            return False
+        maps = clo["_DazSurfaceMap"]
+        if hum.name not in maps.keys():
+            return False
+        struct = maps[hum.name]
+        if struct["hash"] != self.hash:
+            return False
+        nverts = len(clo.data.vertices)
+        indices = np.array(struct["indices"], dtype=np.int32)
+        weights = np.array(struct["weights"], dtype=np.float32)
+        if len(indices) != 3*nverts or len(weights) != 3*nverts:
+            return False
+        self.indices = indices.reshape((nverts,3))
+        self.weights = weights.reshape((nverts,3))
+        return True
+
+
+    def getNearestTriangles(self, hum, clo):
+        from mathutils.bvhtree import BVHTree
+        hverts = getCoordArray(hum.data.vertices)
+        cverts = getCoordArray(clo.data.vertices)
+        tris = []
+        for f in hum.data.polygons:
+            vn0 = f.vertices[0]
+            for vn1,vn2 in zip(f.vertices[1:-1], f.vertices[2:]):
+                tris.append((vn0,vn1,vn2))
+        if not tris:
+            raise DazError("Cannot transfer morphs from mesh without faces:\n%s" % hum.name)
+        bvh = BVHTree.FromPolygons(hverts.tolist(), tris)
+        tris = np.array(tris, dtype=np.int32)
+
+        nverts = len(cverts)
+        tidxs = np.zeros(nverts, dtype=np.int32)
+        locs = cverts.copy()
+        for vn,co in enumerate(cverts.tolist()):
+            loc,_normal,tidx,_dist = bvh.find_nearest(co)
+            if tidx is not None:
+                tidxs[vn] = tidx
+                locs[vn] = loc
+        indices = tris[tidxs]
+        weights = getBarycentricWeights(locs, hverts[indices[:,0]], hverts[indices[:,1]], hverts[indices[:,2]])
+        return indices, weights
+
+
+    def transfer(self, deltas):
+        return np.einsum("ij,ijk->ik", self.weights, deltas[self.indices])
+
+
+def getCoordBounds(coords):
+    if len(coords) == 0:
+        return None
+    return coords.min(axis=0), coords.max(axis=0)
+
+
+def getSurfaceMap(hum, clo):
+    hash = getSurfaceMapHash(hum, clo)
+    smap = SurfaceMap(hum, clo, hash)
+    if smap.restore(hum, clo):
+        print("Reuse surface map %s => %s" % (hum.name, clo.name))
+    else:
+        smap.build(hum, clo)
+        smap.store(hum, clo)
+    return smap
+
+
+def getSurfaceMapHash(hum, clo):
+    import hashlib
+    sha = hashlib.sha1()
+    for ob in [hum, clo]:
+        me = ob.data
+        sha.update(getCoordArray(me.vertices).tobytes())
+        for data,attr in [(me.polygons, "loop_total"), (me.loops, "vertex_index")]:
+            array = np.empty(len(data), dtype=np.int32)
+            data.foreach_get(attr, array)
+            sha.update(array.tobytes())
+    return sha.hexdigest()
+
+
+def getBarycentricWeights(p, a, b, c):
+    v0 = b - a
+    v1 = c - a
+    v2 = p - a
+    d00 = (v0*v0).sum(axis=1)
+    d01 = (v0*v1).sum(axis=1)
+    d11 = (v1*v1).sum(axis=1)
+    d20 = (v2*v0).sum(axis=1)
+    d21 = (v2*v1).sum(axis=1)
+    denom = d00*d11 - d01*d01
+    ok = (np.abs(denom) > 1e-12)
+    denom[~ok] = 1.0
+    v = np.where(ok, (d11*d20 - d01*d21)/denom, 0.0)
+    w = np.where(ok, (d00*d21 - d01*d20)/denom, 0.0)
+    weights = np.stack((1.0-v-w, v, w), axis=1).clip(0.0, 1.0)
+    return (weights / weights.sum(axis=1)[:,None]).astype(np.float32)
 
 
 def correctForRigidity(ob, skey):
-    from mathutils import Matrix
-
-    if "Rigidity" in ob.vertex_groups.keys():
-        idx = ob.vertex_groups["Rigidity"].index
-        for v in ob.data.vertices:
-            for g in v.groups:
-                if g.group == idx:
-                    x = skey.data[v.index]
-                    x.co = v.co + (1 - g.weight)*(x.co - v.co)
-
-    for rgroup in ob.data.DazRigidityGroups:
-        rotmode = rgroup.rotation_mode
-        scalemodes = rgroup.scale_modes.split(" ")
-        maskverts = [elt.a for elt in rgroup.mask_vertices]
-        refverts = [elt.a for elt in rgroup.reference_vertices]
-
-        if rotmode != "none":
-            raise RuntimeError("Not yet implemented: Rigidity rotmode = %s" % rotmode)
-
-        xcoords = [ob.data.vertices[vn].co for vn in refverts]
-        ycoords = [skey.data[vn].co for vn in refverts]
-        xsum = Vector((0,0,0))
-        ysum = Vector((0,0,0))
-        for co in xcoords:
-            xsum += co
-        for co in ycoords:
-            ysum += co
-        xcenter = xsum/len(refverts)
-        ycenter = ysum/len(refverts)
-
-        xdim = ydim = 0
-        for n in range(3):
-            xs = [abs(co[n]-xcenter[n]) for co in xcoords]
-            ys = [abs(co[n]-ycenter[n]) for co in ycoords]
-            xdim += sum(xs)
-            ydim += sum(ys)
-
-        scale = ydim/xdim
-        smat = Matrix.Identity(3)
-        for n,smode in enumerate(scalemodes):
-            if smode == "primary":
-                smat[n][n] = scale
-
-        for n,vn in enumerate(maskverts):
-            skey.data[vn].co = Mult2(smat, (ob.data.vertices[vn].co - xcenter)) + ycenter
+    Rigidity(ob).correct(skey)
+
+
+class Rigidity:
+    def __init__(self, ob):
+        me = ob.data
+        self.coords = getCoordArray(me.vertices)
+        self.factors = None
+        if "Rigidity" in ob.vertex_groups.keys():
+            idx = ob.vertex_groups["Rigidity"].index
+            factors = np.ones(len(me.vertices), dtype=np.float32)
+            for v in me.vertices:
+                for g in v.groups:
+                    if g.group == idx:
+                        factors[v.index] = 1 - g.weight
+            self.factors = factors[:,None]
+
+        self.groups = []
+        for rgroup in me.DazRigidityGroups:
+            rotmode = rgroup.rotation_mode
+            if rotmode != "none":
+                raise RuntimeError("Not yet implemented: Rigidity rotmode = %s" % rotmode)
+            scales = np.zeros(3, dtype=bool)
+            for n,smode in enumerate(rgroup.scale_modes.split(" ")[:3]):
+                scales[n] = (smode == "primary")
+            maskverts = np.array([elt.a for elt in rgroup.mask_vertices], dtype=np.int32)
+            refverts = np.array([elt.a for elt in rgroup.reference_vertices], dtype=np.int32)
+            if len(refverts) > 0:
+                self.groups.append((maskverts, refverts, scales))
+
+
+    def correct(self, skey):
+        xcoords = self.coords
+        ycoords = getCoordArray(skey.data)
+        if self.factors is not None:
+            ycoords = xcoords + self.factors*(ycoords - xcoords)
+
+        for maskverts,refverts,scales in self.groups:
+            xref = xcoords[refverts]
+            yref = ycoords[refverts]
+            xcenter = xref.mean(axis=0)
+            ycenter = yref.mean(axis=0)
+            xdim = np.abs(xref - xcenter).sum()
+            ydim = np.abs(yref - ycenter).sum()
+            if xdim > 0:
+                scale = np.where(scales, ydim/xdim, 1.0)
+            else:
+                scale = np.ones(3)
+            ycoords[maskverts] = (xcoords[maskverts] - xcenter)*scale + ycenter
+
+        skey.data.foreach_set("co", ycoords.astype(np.float32).ravel())
 
 
 def findVertsInGroup(ob, vgrp):
@@ -398,42 +592,227 @@ class DAZ_OT_MixShapekeys(DazOperator, B.MixShapekeysOptions):
 
     def run(self, context):
         ob = context.object
-        skeys = ob.data.shape_keys
         if self.shape1 == self.shape2:
             raise DazError("Cannot merge shapekey to itself")
-        skey1 = skeys.key_blocks[self.shape1]
-        if self.shape2 == "-":
-            skey2 = None
-            factor = self.factor1 - 1
-            coords = [(self.factor1 * skey1.data[n].co - factor * v.co)
-                       for n,v in enumerate(ob.data.vertices)]
-        else:
-            skey2 = skeys.key_blocks[self.shape2]
-            factor = self.factor1 + self.factor2 - 1
-            coords = [(self.factor1 * skey1.data[n].co +
-                       self.factor2 * skey2.data[n].co - factor * v.co)
-                       for n,v in enumerate(ob.data.vertices)]
+        terms = [(self.factor1, self.shape1)]
+        if self.shape2 != "-":
+            terms.append((self.factor2, self.shape2))
         if self.overwrite:
-            skey = skey1
+            target = self.shape1
         else:
-            skey = ob.shape_key_add(name=self.newName)
-        for n,co in enumerate(coords):
-            skey.data[n].co = co
+            target = self.newName
+        algebra = ShapekeyAlgebra(ob)
+        algebra.evaluate((target, "=", terms))
+        algebra.write(self.overwrite)
         if self.delete:
-            if skey2:
-                self.deleteShape(ob, skeys, self.shape2)
-            if not self.overwrite:
-                self.deleteShape(ob, skeys, self.shape1)
+            algebra.deleteUsed()
 
+#----------------------------------------------------------
+#   Shapekey algebra
+#   Shapekeys are treated as offsets from the reference key, so
+#   "New = 0.5*Key1 + Key2" adds half of Key1 to Key2, and
+#   "Key3 *= 0.5" halves the effect of Key3.
+#   Names that are not identifiers must be quoted.
+#----------------------------------------------------------
 
-    def deleteShape(self, ob, skeys, sname):
-        if skeys.animation_data:
-            path = 'key_blocks["%s"].value' % sname
-            skeys.driver_remove(path)
-        updateDrivers(skeys)
-        idx = skeys.key_blocks.keys().index(sname)
-        ob.active_shape_key_index = idx
-        bpy.ops.object.shape_key_remove()
+theShapekeyTokens = re.compile(
+    r'\s*(?:(?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|"(?P<qname>[^"]*)"|' +
+    r'(?P<name>[A-Za-z_][\w.]*)|(?P<op>\+=|-=|\*=|/=|[-+*/=]))')
+
+def tokenizeShapekeyExpression(string):
+    tokens = []
+    pos = 0
+    string = string.rstrip()
+    while pos < len(string):
+        match = theShapekeyTokens.match(string, pos)
+        if match is None or match.end() == pos:
+            raise DazError("Cannot parse shapekey expression:\n%s" % string)
+        if match.group("num") is not None:
+            tokens.append(("num", float(match.group("num"))))
+        elif match.group("qname") is not None:
+            tokens.append(("name", match.group("qname")))
+        elif match.group("name") is not None:
+            tokens.append(("name", match.group("name")))
+        else:
+            tokens.append(("op", match.group("op")))
+        pos = match.end()
+    return tokens
+
+
+def parseShapekeyExpression(string):
+    tokens = tokenizeShapekeyExpression(string)
+    if (len(tokens) < 3 or
+        tokens[0][0] != "name" or
+        tokens[1] not in [("op", op) for op in ["=", "+=", "-=", "*=", "/="]]):
+        raise DazError("Expected <shapekey> = <expression>:\n%s" % string)
+    target = tokens[0][1]
+    op = tokens[1][1]
+    terms = []
+    tokens = tokens[2:]
+    n = 0
+    while n < len(tokens):
+        sign = 1
+        while n < len(tokens) and tokens[n] in [("op", "+"), ("op", "-")]:
+            if tokens[n][1] == "-":
+                sign = -sign
+            n += 1
+        coef = sign
+        name = None
+        mult = "*"
+        while n < len(tokens):
+            type,value = tokens[n]
+            if type == "num":
+                if mult == "/" and value == 0:
+                    raise DazError("Division by zero in shapekey expression:\n%s" % string)
+                coef = (coef*value if mult == "*" else coef/value)
+            elif type == "name" and name is None and mult == "*":
+                name = value
+            else:
+                raise DazError("Cannot parse shapekey expression:\n%s" % string)
+            n += 1
+            if n < len(tokens) and tokens[n] in [("op", "*"), ("op", "/")]:
+                mult = tokens[n][1]
+                n += 1
+            else:
+                break
+        if op in ["*=", "/="]:
+            if name is not None or terms:
+                raise DazError("Expected a number after %s:\n%s" % (op, string))
+        elif name is None:
+            raise DazError("Constant term in shapekey expression:\n%s" % string)
+        terms.append((coef, name))
+        if n < len(tokens) and tokens[n] not in [("op", "+"), ("op", "-")]:
+            raise DazError("Cannot parse shapekey expression:\n%s" % string)
+    return target, op, terms
+
+
+class ShapekeyAlgebra:
+    def __init__(self, ob):
+        self.object = ob
+        self.skeys = ob.data.shape_keys
+        if self.skeys is None:
+            raise DazError("Object %s has no shapekeys" % ob.name)
+        self.reference = self.skeys.reference_key.name
+        self.base = getCoordArray(self.skeys.reference_key.data)
+        self.deltas = {}
+        self.targets = []
+        self.written = []
+        self.used = []
+
+
+    def getDelta(self, sname):
+        if sname not in self.deltas.keys():
+            if sname not in self.skeys.key_blocks.keys():
+                raise DazError("Object %s has no shapekey %s" % (self.object.name, sname))
+            skey = self.skeys.key_blocks[sname]
+            self.deltas[sname] = getCoordArray(skey.data) - self.base
+        return self.deltas[sname]
+
+
+    def evaluate(self, statement):
+        target,op,terms = statement
+        if target == self.reference:
+            raise DazError("Cannot assign to reference shapekey %s" % target)
+        if op in ["*=", "/="]:
+            coef = terms[0][0]
+            if op == "/=" and coef == 0:
+                raise DazError("Cannot divide shapekey %s by zero" % target)
+            delta = self.getDelta(target)
+            delta = (delta*coef if op == "*=" else delta/coef)
+        else:
+            delta = np.zeros(self.base.shape, dtype=np.float32)
+            for coef,sname in terms:
+                delta += coef*self.getDelta(sname)
+                if sname not in self.used:
+                    self.used.append(sname)
+            if op == "+=":
+                delta = self.getDelta(target) + delta
+            elif op == "-=":
+                delta = self.getDelta(target) - delta
+        self.deltas[target] = delta
+        if target not in self.targets:
+            self.targets.append(target)
+
+
+    def write(self, overwrite=True):
+        # Without overwrite, existing shapekeys are kept and the result
+        # goes to a new shapekey, which Blender gives a unique name
+        ob = self.object
+        for sname in self.targets:
+            if overwrite and sname in self.skeys.key_blocks.keys():
+                skey = self.skeys.key_blocks[sname]
+            else:
+                skey = ob.shape_key_add(name=sname, from_mix=False)
+            coords = self.base + self.deltas[sname]
+            skey.data.foreach_set("co", coords.ravel())
+            self.written.append(skey.name)
+        ob.data.update()
+
+
+    def deleteUsed(self):
+        snames = [sname for sname in self.used
+                  if sname not in self.written and sname != self.reference]
+        for sname in snames:
+            deleteShapekey(self.object, self.skeys, sname)
+        updateDrivers(self.skeys)
+        return snames
+
+
+def evalShapekeyExpressions(ob, lines, delete=False):
+    algebra = ShapekeyAlgebra(ob)
+    for line in lines:
+        line = line.strip()
+        if line and line[0] != "#":
+            algebra.evaluate(parseShapekeyExpression(line))
+    algebra.write()
+    deleted = (algebra.deleteUsed() if delete else [])
+    return algebra.targets, deleted
+
+
+def deleteShapekey(ob, skeys, sname):
+    if skeys.animation_data:
+        path = 'key_blocks["%s"].value' % sname
+        skeys.driver_remove(path)
+    ob.shape_key_remove(skeys.key_blocks[sname])
+
+
+class DAZ_OT_EvalShapekeyExpressions(DazOperator, B.ShapekeyAlgebraOptions):
+    bl_idname = "daz.eval_shapekey_expressions"
+    bl_label = "Evaluate Shapekey Expressions"
+    bl_description = "Create, mix and scale shapekeys with linear expressions"
+    bl_options = {'UNDO'}
+
+    @classmethod
+    def poll(self, context):
+        ob = context.object
+        return (ob and ob.type == 'MESH' and ob.data.shape_keys)
+
+
+    def draw(self, context):
+        self.layout.prop(self, "expressions")
+        self.layout.prop_search(self, "textName", bpy.data, "texts")
+        self.layout.prop(self, "delete")
+
+
+    def invoke(self, context, event):
+        context.window_manager.invoke_props_dialog(self, width=500)
+        return {'RUNNING_MODAL'}
+
+
+    def run(self, context):
+        import time
+        t1 = time.perf_counter()
+        ob = context.object
+        lines = self.expressions.split(";")
+        if self.textName:
+            if self.textName not in bpy.data.texts.keys():
+                raise DazError("Text %s not found" % self.textName)
+            for line in bpy.data.texts[self.textName].as_string().split("\n"):
+                lines += line.split(";")
+        targets,deleted = evalShapekeyExpressions(ob, lines, self.delete)
+        t2 = time.perf_counter()
+        print("%s: %d shapekeys written, %d deleted in %.2f seconds" %
+              (ob.name, len(targets), len(deleted), t2-t1))
 
 #----------------------------------------------------------
 #   Initialize
@@ -443,6 +822,7 @@ classes = [
     DAZ_OT_TransferCorrectives,
     DAZ_OT_TransferOtherMorphs,
     DAZ_OT_MixShapekeys,
+    DAZ_OT_EvalShapekeyExpressions,
 ]
 
 def initialize():
@@ -27,6 +27,7 @@
 
 import bpy
 import math
+import numpy as np
 from mathutils import Vector
 from .settings import GS, LS
 
@@ -394,10 +395,105 @@ def showProgress(n, total):
     wm = bpy.context.window_manager
     wm.progress_update(int(pct))
 
+#-------------------------------------------------------------
+#   Vertex group weights
+#   All weights of a mesh as a sparse vertex x group matrix,
+#   stored as parallel arrays with one entry per vertex and group.
+#-------------------------------------------------------------
+
+class WeightMatrix:
+    def __init__(self, ob):
+        self.object = ob
+        verts = []
+        groups = []
+        weights = []
+        for v in ob.data.vertices:
+            for g in v.groups:
+                verts.append(v.index)
+                groups.append(g.group)
+                weights.append(g.weight)
+        self.verts = np.array(verts, dtype=np.int32)
+        self.groups = np.array(groups, dtype=np.int32)
+        self.weights = np.array(weights, dtype=np.float32)
+
+
+    def getGroupMask(self, gn, mask=None):
+        gmask = (self.groups == gn)
+        if mask is not None:
+            gmask &= mask
+        return gmask
+
+
+    def getGroupVerts(self, gns):
+        return np.unique(self.verts[np.isin(self.groups, gns)])
+
+
+    def isEmpty(self, gn):
+        weights = self.weights[self.groups == gn]
+        return not np.any(np.abs(weights-0.5) > 1e-4)
+
+
+    def limit(self, limit):
+        """limit(self, limit):
+        Keep the largest weights of vertices with more than limit groups,
+        and normalize them. Return masks for deleted and changed entries.
+        """
+        nverts = len(self.object.data.vertices)
+        order = np.lexsort((-self.groups, -self.weights, self.verts))
+        counts = np.bincount(self.verts, minlength=nverts)
+        first = np.cumsum(counts) - counts
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order)) - first[self.verts[order]]
+        over = (counts[self.verts] > limit)
+        deleted = over & (rank >= limit)
+        changed = over & (rank < limit)
+        wsums = np.bincount(self.verts[changed], self.weights[changed], minlength=nverts)
+        vnums = self.verts[changed]
+        ok = (wsums[vnums] > 0)
+        weights = self.weights[changed]
+        weights[ok] /= wsums[vnums[ok]]
+        self.weights[changed] = weights
+        return deleted, changed
+
+
+    def removeWeights(self, vgrp, mask, gn=None):
+        if gn is None:
+            gn = vgrp.index
+        vnums = self.verts[self.getGroupMask(gn, mask)]
+        if len(vnums) > 0:
+            vgrp.remove(vnums.tolist())
+
+
+    def addWeights(self, vgrp, mask=None, gn=None):
+        if gn is None:
+            gn = vgrp.index
+        gmask = self.getGroupMask(gn, mask)
+        addGroupWeights(vgrp, self.verts[gmask], self.weights[gmask])
+
+
+def addGroupWeights(vgrp, vnums, weights):
+    # Sort once and split into runs of equal weight, so that each
+    # distinct weight is added in a single call
+    if len(vnums) == 0:
+        return
+    order = np.argsort(weights, kind="stable")
+    vnums = vnums[order]
+    weights = weights[order]
+    values,starts = np.unique(weights, return_index=True)
+    for w,vnums1 in zip(values, np.split(vnums, starts[1:])):
+        vgrp.add(vnums1.tolist(), float(w), 'REPLACE')
+
 #-------------------------------------------------------------
 #   Coords
 #-------------------------------------------------------------
 
+def getCoordArray(data):
+    nverts = len(data)
+    coords = np.empty(3*nverts, dtype=np.float32)
+    data.foreach_get("co", coords)
+    return coords.reshape((nverts,3))
+
+
 def getIndex(id):
     if id == "x": return 0
     elif id == "y": return 1
@@ -450,6 +546,12 @@ def b2d(v):
     else:
         return b2d00(v)
 
+def d2bArray(coords):
+    if GS.zup:
+        return LS.scale*coords[:,[0,2,1]]*np.array((1,-1,1), dtype=np.float32)
+    else:
+        return LS.scale*coords
+
 def d2bu(v):
     if GS.zup:
         return d2b90u(v)